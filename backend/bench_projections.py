@@ -0,0 +1,177 @@
+"""
+Benchmark: full user-document loads vs the named projections in user_views.py.
+
+Usage (from backend/):
+    python bench_projections.py [--iterations 200] [--migrated] [--offline]
+Builds a synthetic user with a year of history (3 meals a day, weekly assessments,
+daily growth points, a full Ojas log). Against MONGO_URL it inserts the user into a
+scratch collection and times find_one per route with and without the projection;
+--offline only computes the BSON bytes each route would transfer. --migrated caps the
+embedded histories the way history_store does after the bucket migration.
+--offline needs neither MongoDB nor MONGO_URL.
+"""
+import asyncio
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import bson
+
+from history_store import HISTORY_RECENT_SIZE
+from ojas_ledger import OJAS_LOG_SIZE
+from user_views import USER_VIEWS
+
+# Route -> view it loads through find_user
+ROUTE_VIEWS = {
+    "/login": "auth",
+    "/user_profile": "profile_card",
+    "/dietary_guidelines": "dosha",
+    "/submit_scan_result": "dosha",
+    "/reset_week": "dosha",
+    "/weekly_summary": "tasks",
+    "/generate_recipe": "recipe_context",
+    "/update_profile": "health_profile",
+    "/post_meal_status": "last_meal",
+    "/register (exists check)": "exists",
+}
+
+
+def synthetic_user(phone: str, migrated: bool, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    start = datetime(2025, 10, 1, 8)
+    meals = [
+        {
+            "items": rng.sample(["Rice", "Dal", "Ghee", "Curd", "Banana", "Milk", "Roti", "Sambar"], 3),
+            "source": rng.choice(("home", "restaurant")),
+            "quality": rng.choice(("Sattvic (Healing)", "Tamasic (Heavy)")),
+            "ojas_change": rng.randint(-15, 12),
+            "timestamp": start + timedelta(hours=5 * i),
+            "feedback_due": None,
+            "feedback_collected": False
+        }
+        for i in range(365 * 3)
+    ]
+    assessments = [
+        {
+            "timestamp": (start + timedelta(weeks=i)).isoformat(),
+            "prakriti": "Vata (Air & Ether)",
+            "agni": "Unknown",
+            "message": "CONCLUSION: Your Vata is high, leading to irregular digestion (Vishamagni). " * 2,
+            "node_reached": "RESULT_VATA_PRO"
+        }
+        for i in range(52)
+    ]
+    growth = [{"score": rng.randint(30, 90), "time": start + timedelta(days=i)} for i in range(365)]
+    ojas_log = [
+        {"at": start + timedelta(hours=5 * i), "why": "meal_scan", "delta": 2, "from": 50, "to": 52}
+        for i in range(OJAS_LOG_SIZE)
+    ]
+    if migrated:
+        meals, assessments, growth = (h[-HISTORY_RECENT_SIZE:] for h in (meals, assessments, growth))
+
+    return {
+        "fullname": "Benchmark Seeker",
+        "phone": phone,
+        "password": "$2b$12$" + "x" * 53,
+        "gender": "female",
+        "onboarding_complete": True,
+        "prakriti": {"vata": 48.0, "pitta": 30.0, "kapha": 22.0, "dominant": "Vata"},
+        "ojas_score": 64,
+        "current_day": 3,
+        "weekly_tasks": [
+            {"id": f"v{i}", "task_en": "Abhyanga (Oil Massage)", "task_kn": "ಅಭ್ಯಂಗ (ತೈಲ ಮಸಾಜ್)",
+             "desc_en": "Use warm sesame oil to ground Vata.", "desc_kn": "ಬೆಚ್ಚಗಿನ ಎಳ್ಳೆಣ್ಣೆ", "done": i % 2 == 0}
+            for i in range(7)
+        ],
+        "health_profile": {"conditions": ["Acidity"], "allergies": ["Peanut"], "weight": 61, "activity_level": "moderate"},
+        "last_meal": meals[-1],
+        "meal_history": meals,
+        "assessment_history": assessments,
+        "growth_history": growth,
+        "ojas_log": ojas_log,
+        "history_version": 2 if migrated else 1
+    }
+
+
+def project(doc: dict, projection: dict) -> dict:
+    """Local stand-in for the server-side projections used in USER_VIEWS (--offline)."""
+    out = {"_id": doc["_id"]} if projection.get("_id", 1) and "_id" in doc else {}
+    for path, spec in projection.items():
+        if path == "_id":
+            continue
+        head, _, rest = path.partition(".")
+        if head not in doc:
+            continue
+        if rest:
+            if rest in doc[head]:
+                out.setdefault(head, {})[rest] = doc[head][rest]
+        elif isinstance(spec, dict) and "$slice" in spec:
+            out[head] = doc[head][spec["$slice"]:]
+        else:
+            out[head] = doc[head]
+    return out
+
+
+def report(rows: list, timed: bool):
+    header = f"{'route':<26}{'view':<16}{'full bytes':>12}{'proj bytes':>12}{'saved':>8}"
+    if timed:
+        header += f"{'full ms':>10}{'proj ms':>10}"
+    print(header)
+    for row in rows:
+        line = f"{row['route']:<26}{row['view']:<16}{row['full']:>12,}{row['proj']:>12,}{1 - row['proj'] / row['full']:>8.1%}"
+        if timed:
+            line += f"{row['full_ms']:>10.2f}{row['proj_ms']:>10.2f}"
+        print(line)
+
+
+def offline(user: dict):
+    user = {"_id": bson.ObjectId(), **user}
+    full = len(bson.encode(user))
+    rows = [
+        {"route": route, "view": view, "full": full, "proj": len(bson.encode(project(user, USER_VIEWS[view])))}
+        for route, view in ROUTE_VIEWS.items()
+    ]
+    report(rows, timed=False)
+
+
+async def online(user: dict, iterations: int):
+    from database import database
+    collection = database.get_collection("bench_users")
+    await collection.delete_many({"phone": user["phone"]})
+    await collection.insert_one(user)
+    try:
+        async def timed(projection):
+            doc = await collection.find_one({"phone": user["phone"]}, projection)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                await collection.find_one({"phone": user["phone"]}, projection)
+            return len(bson.encode(doc)), (time.perf_counter() - started) * 1000 / iterations
+
+        full, full_ms = await timed(None)
+        rows = []
+        for route, view in ROUTE_VIEWS.items():
+            proj, proj_ms = await timed(USER_VIEWS[view])
+            rows.append({"route": route, "view": view, "full": full, "proj": proj, "full_ms": full_ms, "proj_ms": proj_ms})
+        report(rows, timed=True)
+    finally:
+        await collection.delete_many({"phone": user["phone"]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="User-document projection benchmark")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--migrated", action="store_true", help="cap embedded histories like history_store")
+    parser.add_argument("--offline", action="store_true", help="bytes only, no MongoDB needed")
+    args = parser.parse_args()
+
+    user = synthetic_user("bench-0000000000", args.migrated)
+    print(f"Synthetic user: a year of history ({'migrated, recent slices only' if args.migrated else 'legacy, unbounded arrays'})")
+    if args.offline:
+        offline(user)
+    else:
+        asyncio.run(online(user, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: indexed Viruddha engine vs the old per-scan `issubset` loop.
+
+Usage (from backend/):
+    python bench_viruddha.py [--rules 5000] [--plates 2000] [--classes 31]
+Generates synthetic 2-3 item rules over the detector classes, checks that both
+approaches flag exactly the same rules on random plates, and prints time per scan.
+"""
+import random
+import argparse
+import time
+
+from viruddha import ViruddhaEngine
+
+
+def naive_check(rules: list, plate_ids: list) -> list:
+    # The original submit_scan_result logic
+    plate = set(plate_ids)
+    return [rule["reason"] for rule in rules if set(rule["items"]).issubset(plate)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Viruddha rule engine benchmark")
+    parser.add_argument("--rules", type=int, default=5000)
+    parser.add_argument("--plates", type=int, default=2000)
+    parser.add_argument("--classes", type=int, default=31)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    classes = [str(i) for i in range(args.classes)]
+    rules = [
+        {
+            "items": rng.sample(classes, rng.choice((2, 2, 3))),
+            "reason": f"synthetic rule {n}",
+            "risk": rng.choice(("Moderate", "High", "Critical"))
+        }
+        for n in range(args.rules)
+    ]
+    plates = [rng.sample(classes, rng.randint(1, 5)) for _ in range(args.plates)]
+
+    started = time.perf_counter()
+    engine = ViruddhaEngine(rules)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    expected = [naive_check(rules, p) for p in plates]
+    naive_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = [[hit["reason"] for hit in engine.check(p)] for p in plates]
+    indexed_s = time.perf_counter() - started
+
+    assert actual == expected, "Indexed engine disagrees with the naive check"
+    matched = sum(len(m) for m in actual)
+
+    print(f"{args.rules} rules over {args.classes} classes, {args.plates} plates ({matched} rule hits)")
+    print(f"compile:  {compile_ms:8.1f} ms (once at load)")
+    print(f"naive:    {naive_s / args.plates * 1e6:8.1f} µs/scan")
+    print(f"indexed:  {indexed_s / args.plates * 1e6:8.1f} µs/scan  ({naive_s / indexed_s:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import re
+
+_LANG_SUFFIX = re.compile(r"^(?:question|label|message)_([a-z]{2,3})$")
+
+
+def is_result_id(node_id: str) -> bool:
+    return "RESULT" in node_id or node_id == "REVIEW_REQUIRED"
+
+
+class ChatTree:
+    """
+    ayushQnA.json compiled once at load into a flat node table:
+    per-node option maps (choice value -> next node) and the question payload
+    pre-rendered for every language, so a chat step is a couple of dict lookups.
+    """
+
+    def __init__(self, qna: dict):
+        self.version = qna.get("meta", {}).get("version")
+        questions = {}
+        for category in qna.get("categories", {}).values():
+            questions.update(category.get("questions", {}))
+        self.results_raw = qna.get("results", {})
+
+        self.languages = self._find_languages(questions, self.results_raw)
+        self.next_map = {}  # node_id -> {choice value: next node_id}
+        self.payloads = {}  # node_id -> {lang: response body}
+        for node_id, node in questions.items():
+            options = node.get("options", [])
+            self.next_map[node_id] = {o["value"]: o["next"] for o in options}
+            self.payloads[node_id] = {
+                lang: {
+                    "type": "question",
+                    "node_id": node_id,
+                    "question": node.get(f"question_{lang}", node.get("question_en")),
+                    "options": [
+                        {"value": o["value"], "label": o.get(f"label_{lang}", o.get("label_en"))}
+                        for o in options
+                    ]
+                }
+                for lang in self.languages
+            }
+
+        self.results = {
+            node_id: {
+                "prakriti": res.get("prakriti", "Unknown"),
+                "agni": res.get("agni", "Unknown"),
+                "messages": {lang: res.get(f"message_{lang}", res.get("message_en", "Assessment complete."))
+                             for lang in self.languages}
+            }
+            for node_id, res in self.results_raw.items()
+        }
+        self.problems = self.validate()
+
+    @staticmethod
+    def _find_languages(questions: dict, results: dict) -> list:
+        langs = {"en"}
+        for node in list(questions.values()) + list(results.values()):
+            for key in node:
+                match = _LANG_SUFFIX.match(key)
+                if match:
+                    langs.add(match.group(1))
+            for option in node.get("options", []):
+                for key in option:
+                    match = _LANG_SUFFIX.match(key)
+                    if match:
+                        langs.add(match.group(1))
+        return sorted(langs)
+
+    def validate(self) -> list:
+        """Dangling `next` references: targets that are neither a question nor a result."""
+        problems = []
+        for node_id, options in self.next_map.items():
+            for value, target in options.items():
+                if target not in self.payloads and target not in self.results:
+                    problems.append(f"{node_id} --[{value}]--> {target} (missing)")
+        return problems
+
+    def question(self, node_id: str, lang: str):
+        payloads = self.payloads.get(node_id)
+        if payloads is None:
+            return None
+        return payloads.get(lang) or payloads["en"]
+
+    def next_node(self, node_id: str, choice):
+        """Target for a choice; an unknown (or empty) choice stays on the same node."""
+        if not choice:
+            return node_id
+        return self.next_map.get(node_id, {}).get(choice, node_id)
+
+    def result(self, node_id: str, lang: str):
+        """(prakriti, agni, message) for a result node, or None."""
+        res = self.results.get(node_id)
+        if res is None:
+            return None
+        message = res["messages"].get(lang) or res["messages"]["en"]
+        return res["prakriti"], res["agni"], message
@@ -0,0 +1,57 @@
+"""
+Parity check: the exported ONNX detector must return the same food_wisdom class IDs
+as the original ultralytics model.
+
+Usage (from backend/):
+    python check_onnx_parity.py path/to/sample_images [--model models/best.pt]
+Exports the ONNX model first if it is missing. Exits 1 on any mismatch.
+"""
+import os
+import sys
+import json
+import argparse
+
+from imaging import prepare_image, SCAN_IMGSZ
+from onnx_detector import OnnxDetector, ensure_onnx_export
+from vision import TorchDetector, MODEL_PATH
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ultralytics vs ONNX class IDs on sample images")
+    parser.add_argument("samples", help="Directory of sample meal photos")
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    with open("data/ayu_knowledge.json", "r") as f:
+        food_wisdom = json.load(f)["food_wisdom"]
+
+    onnx_path = ensure_onnx_export(args.model, SCAN_IMGSZ)
+    torch_model = TorchDetector(args.model)
+    onnx_model = OnnxDetector(onnx_path, imgsz=SCAN_IMGSZ)
+
+    files = sorted(f for f in os.listdir(args.samples) if f.lower().endswith(IMAGE_EXTS))
+    if not files:
+        print(f"❌ No sample images found in {args.samples}")
+        sys.exit(1)
+
+    mismatches = 0
+    for name in files:
+        with open(os.path.join(args.samples, name), "rb") as f:
+            image, _ = prepare_image(f.read())
+        # Same preprocessed array goes to both backends
+        expected = sorted(set(torch_model([image])[0]))
+        actual = sorted(set(onnx_model([image])[0]))
+        if expected == actual:
+            print(f"✅ {name}: {[food_wisdom.get(str(i), {}).get('name', i) for i in expected]}")
+        else:
+            mismatches += 1
+            print(f"❌ {name}: torch={expected} onnx={actual}")
+
+    print(f"\n{len(files) - mismatches}/{len(files)} images match")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
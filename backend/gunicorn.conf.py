@@ -0,0 +1,26 @@
+import os
+import gc
+
+# PRELOAD-AND-FORK MODE
+# The app (YOLO weights + knowledge JSON) is imported once in the master process,
+# then workers fork and share those pages copy-on-write instead of each loading its own copy.
+os.environ.setdefault("AYU_PRELOAD", "1")
+preload_app = os.environ["AYU_PRELOAD"] == "1"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Each worker still warms its detector (and Gemini client) in the background after fork
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# On deploy/restart workers get this long to finish requests and flush buffered history writes
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far into the permanent generation: the cyclic GC
+    # then never writes to those objects, so shared pages stay shared after fork.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked (shared preload: {preload_app})")
@@ -0,0 +1,119 @@
+import os
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+# Entries kept embedded in the user document (newest last); everything lives in the buckets
+HISTORY_RECENT_SIZE = int(os.getenv("HISTORY_RECENT_SIZE", "20"))
+
+# kind -> (embedded field on the user document, timestamp field of an entry)
+HISTORY_KINDS = {
+    "meals": ("meal_history", "timestamp"),
+    "assessments": ("assessment_history", "timestamp"),
+    "growth": ("growth_history", "time"),
+}
+
+
+def entry_time(kind: str, entry: dict) -> datetime:
+    """When an entry happened (None if unknown); assessments store it as an ISO string."""
+    value = entry.get(HISTORY_KINDS[kind][1])
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, datetime) else None
+
+
+def naive_local(at: datetime) -> datetime:
+    """Stored times are naive datetime.now() values; bring timezone-aware inputs to the same clock."""
+    if at is not None and at.tzinfo is not None:
+        return at.astimezone().replace(tzinfo=None)
+    return at
+
+
+def week_start(at: datetime) -> datetime:
+    """Monday 00:00 of the week containing `at` (naive local time, like the rest of the app)."""
+    day = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+
+def append_recent(field: str, entry: dict) -> dict:
+    """
+    Update-pipeline expression appending `entry` to an embedded history. Only users on
+    history_version 2 (already copied into buckets) are trimmed to HISTORY_RECENT_SIZE;
+    legacy arrays keep growing untouched until migrate_histories.py has copied them.
+    """
+    appended = {"$concatArrays": [{"$ifNull": [f"${field}", []]}, [{"$literal": entry}]]}
+    return {"$cond": [
+        {"$eq": ["$history_version", 2]},
+        {"$slice": [appended, -HISTORY_RECENT_SIZE]},
+        appended
+    ]}
+
+
+class HistoryStore:
+    """
+    Full user histories, bucketed per user, per kind, per week:
+    {_id: "<phone>|<kind>|<YYYY-MM-DD>", phone, kind, week, events: [entry + "at"]}.
+    Migrated user documents only embed the newest HISTORY_RECENT_SIZE entries of each kind.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def _event(kind: str, entry: dict) -> dict:
+        return {**entry, "at": entry_time(kind, entry)}
+
+    @staticmethod
+    def _bucket_filter(phone: str, kind: str, at: datetime) -> dict:
+        week = week_start(at)
+        return {"_id": f"{phone}|{kind}|{week:%Y-%m-%d}", "phone": phone, "kind": kind, "week": week}
+
+    def bucket_op(self, phone: str, kind: str, entries: list, dedupe: bool = False) -> list:
+        """UpdateOne upserts for entries (grouped by week). dedupe=True makes re-running a migration safe."""
+        by_week = {}
+        for entry in entries:
+            event = self._event(kind, entry)
+            if event["at"] is None:
+                continue
+            by_week.setdefault(week_start(event["at"]), []).append(event)
+        op = "$addToSet" if dedupe else "$push"
+        return [
+            UpdateOne(self._bucket_filter(phone, kind, week), {op: {"events": {"$each": events}}}, upsert=True)
+            for week, events in by_week.items()
+        ]
+
+    async def record(self, phone: str, kind: str, entry: dict):
+        event = self._event(kind, entry)
+        await self.collection.update_one(
+            self._bucket_filter(phone, kind, event["at"]),
+            {"$push": {"events": event}},
+            upsert=True
+        )
+
+    async def range(self, phone: str, kind: str, start: datetime = None, end: datetime = None,
+                    limit: int = 100, newest_first: bool = True) -> list:
+        """Entries of one kind with start <= at < end, reading only the buckets that overlap the range."""
+        start, end = naive_local(start), naive_local(end)
+        query = {"phone": phone, "kind": kind}
+        if start or end:
+            query["week"] = {}
+            if start:
+                query["week"]["$gte"] = week_start(start)
+            if end:
+                query["week"]["$lt"] = end
+        cursor = self.collection.find(query, {"_id": 0, "events": 1}).sort("week", -1 if newest_first else 1)
+
+        events = []
+        async for bucket in cursor:
+            matched = [
+                e for e in bucket.get("events", [])
+                if (start is None or e["at"] >= start) and (end is None or e["at"] < end)
+            ]
+            matched.sort(key=lambda e: e["at"], reverse=newest_first)
+            events.extend(matched)
+            if len(events) >= limit:
+                break
+        return events[:limit]
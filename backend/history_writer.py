@@ -0,0 +1,121 @@
+import os
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+HISTORY_FLUSH_INTERVAL_S = float(os.getenv("HISTORY_FLUSH_INTERVAL_S", "1.0"))
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "5000"))
+# How long a producer waits for buffer space before writing its entry directly
+HISTORY_ENQUEUE_TIMEOUT_S = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT_S", "2.0"))
+HISTORY_FLUSH_RETRIES = 3
+
+
+class WriteBehindBuffer:
+    """
+    Groups documents in memory and writes them with one insert_many per batch,
+    flushing when HISTORY_BATCH_SIZE entries are pending or HISTORY_FLUSH_INTERVAL_S has passed.
+    The buffer is bounded: when it is full, producers wait (backpressure) and, past the
+    enqueue timeout, write their own entry directly. stop() drains everything before shutdown.
+    """
+
+    def __init__(self, collection, name: str, batch_size: int = HISTORY_BATCH_SIZE,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL_S, max_pending: int = HISTORY_MAX_PENDING):
+        self.collection = collection
+        self.name = name
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.queue = None
+        self._flusher = None
+        self.written = 0
+        self.batches = 0
+        self.direct_writes = 0
+        self.dropped = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self._flusher = asyncio.create_task(self._run())
+
+    async def enqueue(self, doc: dict):
+        if self.queue is None:
+            # Not started (e.g. scripts): fall back to a plain insert
+            await self.collection.insert_one(doc)
+            return
+        try:
+            await asyncio.wait_for(self.queue.put(doc), HISTORY_ENQUEUE_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            self.direct_writes += 1
+            await self.collection.insert_one(doc)
+
+    async def _next_batch(self) -> list:
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: list):
+        pending, written = batch, 0
+        for attempt in range(1, HISTORY_FLUSH_RETRIES + 1):
+            try:
+                # ordered=False: one bad document doesn't block the rest of the batch
+                await self.collection.insert_many(pending, ordered=False)
+                written += len(pending)
+                pending = []
+            except BulkWriteError as e:
+                # insert_many stamps _id on every doc, so a duplicate key means that doc is already stored
+                errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                written += len(pending) - len(errors)
+                if errors:
+                    print(f"⚠️ {self.name} flush: {len(errors)}/{len(pending)} entries failed "
+                          f"(attempt {attempt}/{HISTORY_FLUSH_RETRIES}): {errors[0].get('errmsg')}")
+                # Retry only the documents the server rejected
+                pending = [pending[err["index"]] for err in errors]
+            except Exception as e:
+                print(f"⚠️ {self.name} flush failed (attempt {attempt}/{HISTORY_FLUSH_RETRIES}): {e}")
+            if not pending:
+                break
+            await asyncio.sleep(0.5 * attempt)
+        self.written += written
+        if written:
+            self.batches += 1
+        if pending:
+            self.dropped += len(pending)
+            print(f"❌ {self.name}: dropped {len(pending)} entries after {HISTORY_FLUSH_RETRIES} attempts")
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def stop(self):
+        """Graceful shutdown: write out everything still buffered, then stop the flusher."""
+        if self.queue is None:
+            return
+        await self.queue.join()
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        print(f"💾 {self.name} flushed on shutdown ({self.written} written, {self.dropped} dropped)")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.queue.qsize() if self.queue else 0,
+            "max_pending": self.max_pending,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 1) if self.batches else 0.0,
+            "direct_writes": self.direct_writes,
+            "dropped": self.dropped
+        }
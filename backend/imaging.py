@@ -0,0 +1,125 @@
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+SCAN_MAX_UPLOAD_MB = float(os.getenv("SCAN_MAX_UPLOAD_MB", "10"))
+MAX_UPLOAD_BYTES = int(SCAN_MAX_UPLOAD_MB * 1024 * 1024)
+# Room for multipart boundaries, part headers and small extra form fields around the image
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Longest side fed to the detector; should match the model's training imgsz
+SCAN_IMGSZ = int(os.getenv("SCAN_IMGSZ", "640"))
+
+
+async def read_upload(request: Request, field: str = "file", max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Parses the multipart body as it arrives off the socket and keeps only the `field` part, in memory.
+    Oversized uploads are refused from Content-Length before any read, or as soon as the running count
+    passes the cap; Starlette's form parser (which spools parts over 1 MB to temp files) is never used.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data image upload")
+    too_large = HTTPException(status_code=413, detail=f"Image too large (max {max_bytes / (1024 * 1024):g} MB)")
+    body_limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > body_limit:
+        raise too_large
+
+    buffer = bytearray()
+    part = {"headers": {}, "name": b"", "value": b"", "wanted": False}
+    state = {"found": False}
+
+    def on_part_begin():
+        part.update(headers={}, name=b"", value=b"", wanted=False)
+
+    def on_header_field(data, start, end):
+        part["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["name"].lower()] = part["value"]
+        part["name"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        # Only the first part named `field` is kept; other form fields are read and dropped
+        part["wanted"] = not state["found"] and disposition.get(b"name") == field.encode()
+        state["found"] = state["found"] or part["wanted"]
+
+    def on_part_data(data, start, end):
+        if part["wanted"]:
+            buffer.extend(data[start:end])
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > body_limit:
+                raise too_large
+            parser.write(chunk)
+            if len(buffer) > max_bytes:
+                raise too_large
+        parser.finalize()
+    except MultipartParseError:
+        raise HTTPException(status_code=400, detail="Malformed multipart upload")
+
+    if not state["found"]:
+        raise HTTPException(status_code=422, detail=f"Missing form field '{field}'")
+    if not buffer:
+        raise HTTPException(status_code=400, detail="Empty image upload")
+    return bytes(buffer)
+
+
+def prepare_image(data: bytes, target: int = SCAN_IMGSZ) -> tuple:
+    """
+    Decodes upload bytes into a BGR numpy array sized for the detector.
+    Returns (array, timings) where timings holds per-stage milliseconds.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = round((now - start) * 1000, 2)
+        start = now
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            # 1. Reduced-resolution decode: JPEG DCT scaling to the smallest size still >= target
+            if img.format == "JPEG":
+                img.draft("RGB", (target, target))
+            img.load()
+            lap("decode")
+
+            # 2. Phone cameras store rotation in EXIF; bake it in before detection
+            img = ImageOps.exif_transpose(img)
+            lap("orient")
+
+            # 3. Downscale (aspect preserved) so YOLO's letterbox has no more work to do
+            img = img.convert("RGB")
+            if max(img.size) > target:
+                img.thumbnail((target, target), Image.BILINEAR)
+            lap("resize")
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=400, detail="Could not decode image")
+
+    array = np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+    lap("to_array")
+    return array, timings
@@ -0,0 +1,66 @@
+import os
+
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") == "1"
+
+# Declared indexes per collection; created at startup, checked by /admin/indexes
+INDEXES = {
+    "users": [
+        # Every route looks users up by phone; unique also makes /register race-free
+        IndexModel([("phone", ASCENDING)], name="phone_unique", unique=True),
+    ],
+    "recipe_history": [
+        # /recipe_history/{phone}: newest first per user
+        IndexModel([("phone", ASCENDING), ("timestamp", DESCENDING)], name="phone_timestamp"),
+    ],
+    "history_buckets": [
+        # history_store.range: one user's buckets of one kind, by week
+        IndexModel([("phone", ASCENDING), ("kind", ASCENDING), ("week", DESCENDING)], name="phone_kind_week"),
+    ],
+}
+
+
+_verified = set()
+
+
+async def has_index(collection, name: str) -> bool:
+    """Whether an index exists; positive answers are remembered, so the hot path pays list_indexes once."""
+    if (collection.name, name) in _verified:
+        return True
+    if name in {ix["name"] async for ix in collection.list_indexes()}:
+        _verified.add((collection.name, name))
+        return True
+    return False
+
+
+async def ensure_indexes(database):
+    """createIndexes for every declared index (no-op when they exist). Failures are logged, never fatal."""
+    for name, models in INDEXES.items():
+        try:
+            created = await database.get_collection(name).create_indexes(models)
+            print(f"🗂️ Indexes ready on {name}: {', '.join(created)}")
+        except Exception as e:
+            # e.g. duplicate phones block the unique index; /register answers 503 until it exists
+            print(f"❌ Index creation failed on {name}: {e}")
+
+
+async def index_report(database) -> dict:
+    """Per collection: declared indexes that are missing, indexes nobody declared, and indexes with no recorded use."""
+    report = {}
+    for name, models in INDEXES.items():
+        collection = database.get_collection(name)
+        declared = {m.document["name"] for m in models}
+        existing = {ix["name"] async for ix in collection.list_indexes()}
+        # $indexStats counters reset on server restart; "unused" means no ops since then
+        usage = {
+            s["name"]: {"ops": s["accesses"]["ops"], "since": s["accesses"]["since"].isoformat()}
+            async for s in collection.aggregate([{"$indexStats": {}}])
+        }
+        report[name] = {
+            "missing": sorted(declared - existing),
+            "undeclared": sorted(existing - declared - {"_id_"}),
+            "unused": sorted(n for n, u in usage.items() if u["ops"] == 0 and n != "_id_"),
+            "usage": usage
+        }
+    return report
@@ -0,0 +1,68 @@
+import re
+
+from viruddha import ViruddhaEngine
+
+DOSHAS = ("Vata", "Pitta", "Kapha")
+
+
+class FoodEntry:
+    """One food_wisdom item with its free-text `dosha` field parsed once at load."""
+
+    __slots__ = ("id", "name", "virya", "dosha", "raw", "doshas", "tridoshic",
+                 "is_pacifying", "is_aggravating", "feedback_dosha", "deep_audit")
+
+    def __init__(self, food_id: str, info: dict):
+        self.id = food_id
+        self.raw = info
+        self.name = info["name"]
+        self.virya = info.get("virya")
+        self.dosha = info.get("dosha", "")
+        text = self.dosha.lower()
+
+        # Doshas named in the text, e.g. "Pitta-Vata pacifying" -> {"vata", "pitta"}
+        self.doshas = frozenset(d.lower() for d in DOSHAS if d.lower() in text)
+        self.tridoshic = "tridoshic" in text
+        # Keyword flags, matching the wording the routes have always checked
+        self.is_pacifying = "pacifying" in text
+        self.is_aggravating = "aggravating" in text
+        # Dosha the post-meal questionnaire focuses on (case-sensitive, Pitta > Kapha > Vata)
+        self.feedback_dosha = next((d for d in ("Pitta", "Kapha", "Vata") if d in self.dosha), "General")
+        self.deep_audit = info.get("deep_audit", {})
+
+    def audit(self, source: str) -> dict:
+        """deep_audit block for "home"/"restaurant"; {} when the item has none for that source."""
+        return self.deep_audit.get(source) or {}
+
+
+class KnowledgeIndex:
+    """
+    ayu_knowledge.json compiled once at load: parsed food entries by ID,
+    pathya/apathya lists precomputed per dominant dosha and the Viruddha rules indexed,
+    so routes do dict lookups instead of re-scanning every food/rule on each request.
+    """
+
+    def __init__(self, ayu_db: dict):
+        self.raw = ayu_db
+        self.version = ayu_db.get("metadata", {}).get("version")
+        self.foods = {food_id: FoodEntry(food_id, info) for food_id, info in ayu_db.get("food_wisdom", {}).items()}
+        self.viruddha = ViruddhaEngine(ayu_db.get("viruddha_ahara_logic", []))
+        self._advice = {}
+        for dosha in DOSHAS:
+            self._advice[dosha.lower()] = self._compute_advice(dosha)
+
+    def food(self, food_id) -> FoodEntry:
+        return self.foods.get(str(food_id)) if food_id is not None else None
+
+    def _compute_advice(self, dominant: str) -> tuple:
+        key = dominant.lower()
+        # Same selection the dietary_guidelines route always used, in knowledge-base order
+        pathya = [f.raw for f in self.foods.values() if key in f.dosha.lower() or f.tridoshic]
+        apathya = [f.raw for f in self.foods.values() if f.is_aggravating and key in f.dosha.lower()]
+        return pathya, apathya
+
+    def diet_advice(self, dominant: str) -> tuple:
+        """(pathya, apathya) food lists for a dominant dosha; unknown values are computed once and kept."""
+        key = re.sub(r"\s+", " ", str(dominant)).strip().lower()
+        if key not in self._advice:
+            self._advice[key] = self._compute_advice(key)
+        return self._advice[key]
@@ -0,0 +1,144 @@
+import os
+import json
+import asyncio
+import hashlib
+from datetime import datetime
+
+from knowledge import KnowledgeIndex
+from chat_tree import ChatTree
+
+# Seconds between mtime checks of the JSON files; 0 disables the watcher (admin endpoint only)
+KNOWLEDGE_WATCH_INTERVAL_S = float(os.getenv("KNOWLEDGE_WATCH_INTERVAL_S", "10"))
+
+
+class KnowledgeSnapshot:
+    """
+    One immutable version of both knowledge files with their compiled indexes.
+    Routes grab `knowledge_store.current` once and use it for the whole request,
+    so a reload mid-request never mixes two versions.
+    """
+
+    __slots__ = ("version", "knowledge", "chat", "loaded_at", "mtimes")
+
+    def __init__(self, version: str, knowledge: KnowledgeIndex, chat: ChatTree, mtimes: dict):
+        self.version = version
+        self.knowledge = knowledge
+        self.chat = chat
+        self.loaded_at = datetime.now()
+        self.mtimes = mtimes
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "knowledge_version": self.knowledge.version,
+            "foods": len(self.knowledge.foods),
+            "viruddha_rules": len(self.knowledge.viruddha.rules),
+            "chat_questions": len(self.chat.payloads),
+            "chat_results": len(self.chat.results),
+            "chat_problems": self.chat.problems,
+            "loaded_at": self.loaded_at.isoformat()
+        }
+
+
+class KnowledgeStore:
+    """
+    Holds the current KnowledgeSnapshot and swaps it atomically (a single reference
+    assignment) after a new one has been fully built on a worker thread.
+    A failed reload keeps serving the previous snapshot.
+
+    Each gunicorn worker has its own store: the admin endpoint reloads the worker that
+    answers it, the mtime watcher picks up file changes in every worker.
+    """
+
+    def __init__(self, knowledge_path: str, qna_path: str):
+        self.knowledge_path = knowledge_path
+        self.qna_path = qna_path
+        self.current = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self._lock = None
+        self._failed_mtimes = None
+
+    def _mtimes(self) -> dict:
+        mtimes = {}
+        for path in (self.knowledge_path, self.qna_path):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _build(self, strict_qna: bool) -> KnowledgeSnapshot:
+        mtimes = self._mtimes()
+        digest = hashlib.sha256()
+
+        with open(self.knowledge_path, "rb") as f:
+            raw = f.read()
+        digest.update(raw)
+        ayu_db = json.loads(raw)
+
+        ayush_qna = {}
+        try:
+            with open(self.qna_path, "rb") as f:
+                raw = f.read()
+            digest.update(raw)
+            ayush_qna = json.loads(raw)
+        except Exception as e:
+            if strict_qna:
+                raise
+            print(f"❌ JSON LOAD ERROR: {e}")
+
+        return KnowledgeSnapshot(digest.hexdigest()[:12], KnowledgeIndex(ayu_db), ChatTree(ayush_qna), mtimes)
+
+    def load(self) -> KnowledgeSnapshot:
+        """Initial (import-time) load. A missing QnA file degrades to an empty chat tree, as before."""
+        self.current = self._build(strict_qna=False)
+        for problem in self.current.chat.problems:
+            print(f"⚠️ Chat tree: dangling next reference {problem}")
+        return self.current
+
+    async def reload(self, force: bool = False) -> dict:
+        """Rebuild both indexes off the event loop and swap them in. Skips if nothing changed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            previous = self.current
+            try:
+                snapshot = await asyncio.to_thread(self._build, True)
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"❌ Knowledge reload failed, keeping version {previous.version}: {self.last_error}")
+                return {"reloaded": False, "version": previous.version, "error": self.last_error}
+
+            self.last_error = None
+            if not force and snapshot.version == previous.version:
+                previous.mtimes = snapshot.mtimes
+                return {"reloaded": False, "version": previous.version}
+
+            self.current = snapshot
+            self.reloads += 1
+            print(f"🔁 Knowledge reloaded: {previous.version} -> {snapshot.version}")
+            for problem in snapshot.chat.problems:
+                print(f"⚠️ Chat tree: dangling next reference {problem}")
+            return {"reloaded": True, "version": snapshot.version, "previous_version": previous.version}
+
+    async def watch(self, interval: float = KNOWLEDGE_WATCH_INTERVAL_S):
+        """Poll the files' mtimes and reload when either changes."""
+        while True:
+            await asyncio.sleep(interval)
+            mtimes = self._mtimes()
+            # A file that failed to parse is retried only once it changes again
+            if mtimes != self.current.mtimes and mtimes != self._failed_mtimes:
+                result = await self.reload()
+                self._failed_mtimes = mtimes if "error" in result else None
+
+    def stats(self) -> dict:
+        return {
+            **self.current.info(),
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "last_error": self.last_error,
+            "watch_interval_s": KNOWLEDGE_WATCH_INTERVAL_S
+        }
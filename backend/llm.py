@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import asyncio
+import threading
+
+from fastapi import HTTPException
+
+# CLIENT CONFIGURATION (Direct Key for Local Stability)
+# Forced v1beta for JSON Schema support with developer keys
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "8"))
+LLM_CALL_TIMEOUT_S = float(os.getenv("LLM_CALL_TIMEOUT_S", "20"))
+# How long a request may wait for a free slot before we shed it with 429
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "10"))
+
+_client = None
+_client_lock = threading.Lock()
+# starting -> ready (or failed); reported by /health
+_status = "starting"
+
+
+def get_client():
+    """Builds the Gemini client on first use; google-genai is slow to import, so it stays off the startup path."""
+    global _client, _status
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    from google import genai
+                    _client = genai.Client(
+                        api_key=GEMINI_API_KEY,
+                        http_options={'api_version': 'v1beta'}
+                    )
+                    _status = "ready"
+                except Exception:
+                    _status = "failed"
+                    raise
+    return _client
+
+
+def llm_status() -> str:
+    return _status
+
+
+def warm_up():
+    """Background startup hook: import + build the client before the first recipe request."""
+    try:
+        get_client()
+    except Exception as e:
+        print(f"❌ Gemini client failed to load: {e}")
+
+
+# Per-process cap on concurrent Gemini calls (asyncio primitives bind to the loop on first use)
+_inflight = asyncio.Semaphore(LLM_MAX_INFLIGHT)
+
+
+async def _ready_client():
+    # First call may still be importing google-genai: do that on a thread, not the event loop
+    return _client if _client is not None else await asyncio.to_thread(get_client)
+
+
+async def _acquire_slot():
+    try:
+        await asyncio.wait_for(_inflight.acquire(), LLM_QUEUE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=429, detail="AI kitchen is at capacity. Wait 30s.")
+
+
+class CallClock:
+    """Duration of the Gemini call itself: starts once a slot is held, so client import and queueing don't count."""
+
+    def __init__(self):
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started if self.started is not None else 0.0
+
+
+async def generate_json(model_id: str, prompt: str, schema: dict, timeout: float = LLM_CALL_TIMEOUT_S,
+                        clock: CallClock = None) -> dict:
+    """
+    One structured-JSON Gemini call on the async client: never blocks the event loop,
+    waits for one of LLM_MAX_INFLIGHT slots and is cut off after `timeout` seconds.
+    """
+    from google.genai import types
+    client = await _ready_client()
+
+    await _acquire_slot()
+    if clock:
+        clock.start()
+    try:
+        response = await asyncio.wait_for(
+            client.aio.models.generate_content(
+                model=model_id,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=schema
+                )
+            ),
+            timeout
+        )
+    finally:
+        _inflight.release()
+    return json.loads(response.text)
+
+
+async def stream_json_text(model_id: str, prompt: str, schema: dict, timeout: float = LLM_CALL_TIMEOUT_S,
+                           clock: CallClock = None):
+    """
+    Streaming variant of generate_json: yields raw JSON text chunks as Gemini produces them.
+    Holds one in-flight slot for the whole stream; `timeout` bounds the total stream time.
+    """
+    from google.genai import types
+    client = await _ready_client()
+
+    await _acquire_slot()
+    if clock:
+        clock.start()
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        stream = await asyncio.wait_for(
+            client.aio.models.generate_content_stream(
+                model=model_id,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=schema
+                )
+            ),
+            timeout
+        )
+        chunks = stream.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, deadline - loop.time()))
+            except StopAsyncIteration:
+                break
+            if chunk.text:
+                yield chunk.text
+    finally:
+        _inflight.release()
@@ -1,10 +1,57 @@
 from fastapi import FastAPI, Body, HTTPException
-from database import user_collection, user_helper
-import bcrypt
+from database import user_collection, user_helper, database
+import passwords
+from user_queries import find_user
+from indexes import ensure_indexes, index_report, has_index, MONGO_ENSURE_INDEXES
+from pymongo.errors import DuplicateKeyError
+from history_store import HistoryStore, HISTORY_KINDS, append_recent
 from pydantic import BaseModel
-from fastapi import FastAPI, Body, HTTPException, File, UploadFile, BackgroundTasks
-app = FastAPI()
-from google import genai
+from fastapi import FastAPI, Body, HTTPException, BackgroundTasks
+from contextlib import asynccontextmanager
+import asyncio
+from vision import vision_engine
+import os
+from llm import get_client, llm_status, generate_json, stream_json_text, CallClock, warm_up as warm_up_llm
+from model_router import ModelRouter, classify_error
+from recipe_cache import recipe_cache, recipe_fingerprint
+from singleflight import SingleFlight
+from recipe_stream import PartialRecipeParser, sse
+from recipe_index import recipe_index
+from history_writer import WriteBehindBuffer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Per-worker startup: inference threads bind to this worker's event loop.
+    # Heavy loading (YOLO, google-genai) happens in the background; /health reports progress.
+    await vision_engine.start()
+    await history_writer.start()
+    # Declared indexes (see indexes.py); built in the background so a slow Atlas doesn't delay startup
+    index_setup = asyncio.create_task(ensure_indexes(database)) if MONGO_ENSURE_INDEXES else None
+    llm_warmup = asyncio.create_task(asyncio.to_thread(warm_up_llm))
+    index_build = asyncio.create_task(recipe_index.build(history_collection, user_collection))
+    knowledge_watch = asyncio.create_task(knowledge_store.watch()) if KNOWLEDGE_WATCH_INTERVAL_S > 0 else None
+    yield
+    llm_warmup.cancel()
+    index_build.cancel()
+    if knowledge_watch:
+        knowledge_watch.cancel()
+    if index_setup:
+        index_setup.cancel()
+    await vision_engine.stop()
+    # Flush buffered history before the worker exits so deploys don't lose entries
+    await history_writer.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# Meal / assessment / growth histories, bucketed per user per week (see history_store.py)
+history_store = HistoryStore(database.get_collection("history_buckets"))
+
+# Preload-and-fork (see gunicorn.conf.py): weights load once in the master, workers share them
+if os.getenv("AYU_PRELOAD") == "1":
+    try:
+        vision_engine.preload()
+    except Exception as e:
+        print(f"⚠️ Vision preload failed, workers will load their own copy: {e}")
 
 @app.get("/")
 async def root():
@@ -12,11 +59,17 @@ async def root():
 
 @app.post("/register")
 async def register_user(user_data: dict = Body(...)):
-    existing_user = await user_collection.find_one({"phone": user_data['phone']})
-    if existing_user:
+    # Fast path: known phones are rejected before paying for a bcrypt hash
+    if await find_user(user_data['phone'], "exists"):
         raise HTTPException(status_code=400, detail="Phone already exists")
-    
-    hashed_pass = bcrypt.hashpw(user_data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    # Without the unique index, concurrent sign-ups could create duplicate accounts
+    if not await has_index(user_collection, "phone_unique"):
+        print("❌ users.phone_unique index is missing: refusing sign-ups (check /admin/indexes and the startup log)")
+        raise HTTPException(status_code=503, detail="Registration is temporarily unavailable")
+
+    # Hashing runs on the bounded bcrypt pool (see passwords.py), never on the event loop
+    hashed_pass = await passwords.hash_password(user_data['password'])
+    growth_entry = {"score": 40, "time": datetime.now()}
     
     new_user = {
         "fullname": user_data['fullname'],
@@ -28,7 +81,9 @@ async def register_user(user_data: dict = Body(...)):
         "current_day": 1,
         "weekly_tasks": [],
         "assessment_history": [],
-        "growth_history": [{"score": 40, "time": datetime.now()}],
+        "growth_history": [growth_entry],
+        # Histories are bucketed in history_buckets; the user document only embeds recent slices
+        "history_version": 2,
         # NEW: Medical Profile Placeholders
         "health_profile": {
             "conditions": [],
@@ -38,7 +93,12 @@ async def register_user(user_data: dict = Body(...)):
         }
     }
     
-    await user_collection.insert_one(new_user)
+    # Race backstop: of two simultaneous sign-ups, the unique index lets only one through
+    try:
+        await user_collection.insert_one(new_user)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Phone already exists")
+    await history_store.record(user_data['phone'], "growth", growth_entry)
     return {"status": "User created successfully"}
 
 from bson import ObjectId
@@ -90,29 +150,38 @@ async def update_prakriti(phone: str, quiz_data: dict = Body(...)):
 # Define a schema for the incoming JSON
 from fastapi import FastAPI, HTTPException, Body
 from pydantic import BaseModel
-import bcrypt
 
 # 1. Define the Schema (Crucial for fixing the 404/422 errors)
 class LoginSchema(BaseModel):
     phone: str
     password: str
 
+async def upgrade_password_hash(phone: str, password: str):
+    """Re-hash with the current BCRYPT_ROUNDS after a successful login (runs after the response)."""
+    try:
+        new_hash = await passwords.rehash_password(password)
+    except HTTPException:
+        return  # Pool is saturated; try again on the next login
+    await user_collection.update_one({"phone": phone}, {"$set": {"password": new_hash}})
+
 @app.post("/login")
-async def login(data: LoginSchema):
+async def login(data: LoginSchema, background_tasks: BackgroundTasks):
     # DEBUG: This will print in your terminal when Flutter hits the button
     print(f"🚀 LOGIN ATTEMPT: Phone={data.phone}")
 
     # 2. Find User
-    user = await user_collection.find_one({"phone": data.phone})
+    user = await find_user(data.phone, "auth")
     
     if not user:
         print(f"❌ ERROR: User {data.phone} not found in DB")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # 3. Verify Password
-    # Note: Using .encode() because bcrypt needs bytes
-    if bcrypt.checkpw(data.password.encode('utf-8'), user["password"].encode('utf-8')):
+    # Verified on the bounded bcrypt pool; a saturated pool sheds the attempt with 429
+    if await passwords.verify_password(data.password, user["password"]):
         print(f"✅ SUCCESS: {data.phone} logged in")
+        if passwords.needs_rehash(user["password"]):
+            background_tasks.add_task(upgrade_password_hash, user["phone"], data.password)
         return {
             "status": "success",
             "fullname": user.get("fullname", "Seeker"),
@@ -197,8 +266,8 @@ async def update_onboarding(phone: str, data: dict = Body(...)):
 
 @app.get("/user_profile/{phone}")
 async def get_user_profile(phone: str):
-    # 1. Fetch user from MongoDB
-    user = await user_collection.find_one({"phone": phone})
+    # 1. Fetch the profile card fields from MongoDB
+    user = await find_user(phone, "profile_card")
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -236,67 +305,85 @@ async def get_user_profile(phone: str):
 
 @app.get("/dietary_guidelines/{phone}")
 async def get_diet_advice(phone: str):
-    user = await user_collection.find_one({"phone": phone})
+    user = await find_user(phone, "dosha")
     dominant = user.get("prakriti", {}).get("dominant", "Vata")
     
-    # Filter wisdom based on dominant dosha
-    safe_foods = [v for k, v in ayu_db["food_wisdom"].items() if dominant.lower() in v["dosha"].lower() or "tridoshic" in v["dosha"].lower()]
-    risky_foods = [v for k, v in ayu_db["food_wisdom"].items() if "aggravating" in v["dosha"].lower() and dominant.lower() in v["dosha"].lower()]
+    # Pathya/Apathya lists are precomputed per dosha at load (see knowledge.py)
+    safe_foods, risky_foods = knowledge_store.current.knowledge.diet_advice(dominant)
     
     return {
         "pathya": safe_foods[:5], # Top recommended
         "apathya": risky_foods[:5] # Foods to avoid
     }
 
-import json
-import shutil
-from fastapi import File, UploadFile
-from ultralytics import YOLO
-
-# 1. Load the YOLO Model
-model = YOLO("models/best.pt")
-
-# 2. Load the Ayurvedic Knowledge Base
-with open("data/ayu_knowledge.json", "r") as f:
-    ayu_db = json.load(f)
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from imaging import read_upload, prepare_image
+from scan_cache import scan_cache, scan_key
+from knowledge_store import KnowledgeStore, KNOWLEDGE_WATCH_INTERVAL_S
+from viruddha import ViruddhaEngine
+from chat_tree import is_result_id
+import time
+
+# 1. Load the Ayurvedic Knowledge Base and the Q&A decision tree as one versioned snapshot
+# Compiled once per version: parsed dosha flags, per-dosha diet lists, Viruddha index, chat node table.
+# Routes read `knowledge_store.current` once per request; reloads swap it without a restart.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+knowledge_store = KnowledgeStore(
+    os.path.join(BASE_DIR, "data", "ayu_knowledge.json"),
+    os.path.join(BASE_DIR, "data", "ayushQnA.json")
+)
+knowledge_store.load()
 
 
 from datetime import datetime
 
-# FIXED: Vision Engine lookup using string IDs
-# 1. Global variable initialized to None to save RAM on startup
-model = None 
+def prepare_scan(data: bytes) -> tuple:
+    """(image, cache key, cached class IDs or None, timings) for an upload; runs in a threadpool thread."""
+    image, timings = prepare_image(data)
+    # Retries of the same photo (and, if enabled, close retakes) are answered from the scan cache
+    started = time.perf_counter()
+    image_key = scan_key(image)
+    class_ids = scan_cache.get(image_key)
+    timings["hash"] = round((time.perf_counter() - started) * 1000, 2)
+    return image, image_key, class_ids, timings
 
+# FIXED: Vision Engine lookup using string IDs
+# YOLO instances are owned by the vision engine's worker threads (see vision.py)
 @app.post("/scan_meal")
-async def scan_meal(file: UploadFile = File(...)):
-    global model
-    if model is None:
-        model = YOLO("models/best.pt") 
-
-    file_path = f"temp_{file.filename}"
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+async def scan_meal(request: Request):
+    # Multipart form field "file": parsed straight off the request stream and decoded in memory
+    data = await read_upload(request, "file")
+    # Decode, hash and cache lookup are all CPU work: one threadpool hop keeps them off the event loop
+    image, image_key, class_ids, timings = await run_in_threadpool(prepare_scan, data)
+
+    if class_ids is None:
+        # Inference runs off the event loop; other routes keep serving meanwhile
+        started = time.perf_counter()
+        class_ids = await vision_engine.detect(image)
+        timings["inference"] = round((time.perf_counter() - started) * 1000, 2)
+        scan_cache.put(image_key, class_ids)
+    detected_items = []
+    knowledge = knowledge_store.current.knowledge
+    
+    for cls_id in class_ids:
+        food = knowledge.food(cls_id)
+        if food:
+            detected_items.append({
+                "id": food.id,
+                "name": food.name,
+                "dosha_impact": food.dosha,
+                "virya": food.virya
+            })
+    
+    # Step 1: Return identification to Flutter for confirmation
+    return {"items": detected_items, "timings_ms": timings}
 
-        results = model(file_path)
-        detected_items = []
-        
-        for box in results[0].boxes:
-            idx = str(int(box.cls)) 
-            info = ayu_db["food_wisdom"].get(idx)
-            if info:
-                detected_items.append({
-                    "id": idx,
-                    "name": info["name"],
-                    "dosha_impact": info["dosha"],
-                    "virya": info["virya"]
-                })
-        
-        # Step 1: Return identification to Flutter for confirmation
-        return {"items": detected_items}
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+@app.get("/admin/scan_cache")
+async def scan_cache_stats():
+    return {"status": "success", "data": scan_cache.stats()}
 
 @app.post("/confirm_scan/{phone}")
 async def confirm_scan(phone: str, data: dict = Body(...)):
@@ -306,7 +393,8 @@ async def confirm_scan(phone: str, data: dict = Body(...)):
     is_homemade = data.get("is_homemade", True)
     item_id = data.get("item_id")
     
-    info = ayu_db["food_wisdom"].get(item_id)
+    food = knowledge_store.current.knowledge.food(item_id)
+    info = food.raw if food else None
     
     # Logic: Restaurant penalty
     ojas_impact = 10 if is_homemade else 4
@@ -326,129 +414,59 @@ async def confirm_scan(phone: str, data: dict = Body(...)):
 
 
 
-import os
+async def finish_assessment(chat_tree, node_id: str, lang: str, phone):
+    res = chat_tree.result(node_id, lang)
+    if res is None:
+        raise HTTPException(status_code=404, detail=f"Result node {node_id} not found")
+    prakriti, agni, message = res
 
-# Get the absolute path to the folder containing main.py
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    assessment_entry = {
+        "timestamp": datetime.now().isoformat(),
+        "prakriti": prakriti,
+        "agni": agni,
+        "message": message,
+        "node_reached": node_id
+    }
 
-# Load the Q&A Knowledge Base using an absolute path
-# main.py - Improved Debug Loading
-qna_path = os.path.join(BASE_DIR, "data", "ayushQnA.json")
+    if phone:
+        # Recent slice on the user document (trimmed only once migrated), full history in the weekly bucket.
+        # The phone comes from the client: only a known user gets a bucket entry.
+        result = await user_collection.update_one(
+            {"phone": phone},
+            [{"$set": {"assessment_history": append_recent("assessment_history", assessment_entry)}}]
+        )
+        if result.matched_count == 1:
+            await history_store.record(phone, "assessments", assessment_entry)
 
-ayush_qna = {}
+    return {"type": "result", "data": assessment_entry}
 
-try:
-    with open(qna_path, "r", encoding="utf-8") as f:
-        ayush_qna = json.load(f)
-    
-    # SENIOR DEBUG: Verify the structure immediately
-    top_keys = list(ayush_qna.keys())
-    print(f"✅ JSON Loaded. Top-level keys found: {top_keys}")
-    
-    if "categories" in ayush_qna:
-        categories = list(ayush_qna["categories"].keys())
-        print(f"📂 Categories found: {categories}")
-    else:
-        print("⚠️ CRITICAL: Key 'categories' NOT found in JSON. Check your JSON file structure!")
 
-except Exception as e:
-    print(f"❌ JSON LOAD ERROR: {e}")
 @app.post("/chat_query")
 async def chat_query(data: dict = Body(...)):
-    # 1. Capture Input Data
     node_id = data.get("current_node", "AGNI_Q1")
-    choice_value = data.get("user_choice")
     lang = data.get("lang", "en")
     phone = data.get("phone")
+    chat_tree = knowledge_store.current.chat
 
-    print(f"\n--- 🤖 CHAT DEBUG START ---")
-    print(f"📍 Current Node Requested: {node_id}")
-    print(f"🔘 User Choice: {choice_value}")
-
-    # 2. Safety Check: Is the JSON even loaded?
-    if not ayush_qna:
-        print("❌ CRITICAL: 'ayush_qna' dictionary is EMPTY. Check JSON loading at startup.")
+    if not chat_tree.payloads:
         raise HTTPException(status_code=500, detail="Knowledge base not loaded on server.")
 
-    # 3. Build Question Pool with detailed tracking
-    categories = ayush_qna.get("categories", {})
-    agni_qs = categories.get("agni_assessment", {}).get("questions", {})
-    dosha_qs = categories.get("dosha_assessment", {}).get("questions", {})
-    
-    questions_pool = {**agni_qs, **dosha_qs}
-    
-    print(f"📊 Total Nodes in Pool: {len(questions_pool)}")
-    print(f"🔑 Available Node IDs: {list(questions_pool.keys())[:10]}... (showing first 10)")
+    # 1. End of tree
+    if is_result_id(node_id):
+        return await finish_assessment(chat_tree, node_id, lang, phone)
 
-    # 4. Handle Result Logic (End of Tree)
-    if "RESULT" in node_id or node_id == "REVIEW_REQUIRED":
-        print(f"🏁 Result Node Reached: {node_id}")
-        results_map = ayush_qna.get("results", {})
-        res = results_map.get(node_id)
-        
-        if not res:
-            print(f"❌ ERROR: Result node '{node_id}' missing from 'results' key in JSON.")
-            raise HTTPException(status_code=404, detail=f"Result node {node_id} not found")
-
-        assessment_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "prakriti": res.get("prakriti", "Unknown"),
-            "agni": res.get("agni", "Unknown"),
-            "message": res.get(f"message_{lang}", res.get("message_en", "Assessment complete.")),
-            "node_reached": node_id
-        }
-        
-        if phone:
-            print(f"💾 Saving assessment to DB for phone: {phone}")
-            await user_collection.update_one(
-                {"phone": phone},
-                {"$push": {"assessment_history": assessment_entry}}
-            )
-
-        return {"type": "result", "data": assessment_entry}
-
-    # 5. Extract Question Node
-    current_node = questions_pool.get(node_id)
-    
-    if not current_node:
-        print(f"🚨 FAIL: Node '{node_id}' not found in the constructed pool.")
-        # Diagnostic: Check if keys are actually under 'categories -> questions' directly
-        top_keys = list(ayush_qna.keys())
-        print(f"💡 Hint: Check your JSON nesting. Top-level keys: {top_keys}")
+    if node_id not in chat_tree.next_map:
         raise HTTPException(status_code=404, detail=f"Node {node_id} not found in database.")
 
-    # 6. Determine Next Node
-    next_node_id = node_id 
-    if choice_value:
-        found_choice = False
-        for opt in current_node.get("options", []):
-            if opt["value"] == choice_value:
-                next_node_id = opt["next"]
-                found_choice = True
-                print(f"➡️ Choice Match! Next node will be: {next_node_id}")
-                break
-        if not found_choice:
-            print(f"⚠️ WARNING: User choice '{choice_value}' did not match any options in {node_id}")
-
-    next_node = questions_pool.get(next_node_id)
-
-    # 7. Recursive Transition (If the next step is a result)
-    if not next_node: 
-        print(f"🔄 Node '{next_node_id}' is not a question. Triggering result logic...")
-        return await chat_query({"current_node": next_node_id, "lang": lang, "phone": phone})
-
-    print(f"✅ Returning Question: {next_node_id}")
-    print(f"--- 🤖 CHAT DEBUG END ---\n")
+    # 2. Transition (an unmatched choice keeps the user on the same question)
+    next_node_id = chat_tree.next_node(node_id, data.get("user_choice"))
 
-    return {
-        "type": "question",
-        "node_id": next_node_id,
-        "question": next_node.get(f"question_{lang}", next_node.get("question_en")),
-        "options": [
-            {"value": o["value"], "label": o.get(f"label_{lang}", o.get("label_en"))} 
-            for o in next_node.get("options", [])
-        ]
-    }
+    question = chat_tree.question(next_node_id, lang)
+    if question is not None:
+        return question
+    if is_result_id(next_node_id):
+        return await finish_assessment(chat_tree, next_node_id, lang, phone)
+    raise HTTPException(status_code=404, detail=f"Node {next_node_id} not found in database.")
 
 from datetime import datetime
 # UPDATED: Task completion now triggers an Ojas update
@@ -486,6 +504,9 @@ DINACHARYA_WEEKLY = {
     ]
 }
 # SMART MOVE: Scoring Engine
+from pymongo import ReturnDocument
+from ojas_ledger import ledger_stages, apply_ojas_delta, audit_log
+
 @app.post("/update_task/{phone}")
 async def update_task(phone: str, payload: dict = Body(...)):
     task_id = payload.get("taskId")
@@ -494,24 +515,32 @@ async def update_task(phone: str, payload: dict = Body(...)):
     # Generate human-readable timestamp
     now = datetime.now().strftime("%d %b, %I:%M %p")
     
-    # Update state and timestamp in one atomic operation
-    await user_collection.update_one(
-        {"phone": phone, "weekly_tasks.id": task_id},
-        {"$set": {
-            "weekly_tasks.$.done": is_done,
-            "weekly_tasks.$.completed_at": now if is_done else None
-        }}
-    )
-    
-    # Recalculate Ojas: Base 40 + (10 points per task)
-    user = await user_collection.find_one({"phone": phone})
-    done_count = sum(1 for t in user.get("weekly_tasks", []) if t.get("done"))
-    new_ojas = min(100, 40 + (done_count * 8))
-    
-    await user_collection.update_one(
+    # One round trip: flip the task, stamp it and recompute Ojas from the updated list
+    # server-side (pipeline update), so two fast taps can never write a stale score
+    task_patch = {"done": is_done, "completed_at": now if is_done else None}
+    user = await user_collection.find_one_and_update(
         {"phone": phone},
-        {"$set": {"ojas_score": new_ojas}}
+        [
+            {"$set": {"weekly_tasks": {"$map": {
+                "input": {"$ifNull": ["$weekly_tasks", []]},
+                "as": "t",
+                "in": {"$cond": [
+                    {"$eq": ["$$t.id", {"$literal": task_id}]},
+                    {"$mergeObjects": ["$$t", {"$literal": task_patch}]},
+                    "$$t"
+                ]}
+            }}}},
+            # Ojas: Base 40 + 8 points per completed task, capped at 100 (logged in the Ojas ledger)
+            *ledger_stages("dinacharya", {"$add": [40, {"$multiply": [8, {"$size": {
+                "$filter": {"input": "$weekly_tasks", "as": "t", "cond": "$$t.done"}
+            }}]}]})
+        ],
+        projection={"_id": 0, "ojas_score": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    new_ojas = user["ojas_score"]
     return {"status": "success", "completed_at": now, "new_ojas": new_ojas}
 
 
@@ -519,7 +548,7 @@ async def update_task(phone: str, payload: dict = Body(...)):
 # 4. RESET WEEK ROUTE
 @app.post("/reset_week/{phone}")
 async def reset_week(phone: str):
-    user = await user_collection.find_one({"phone": phone})
+    user = await find_user(phone, "dosha")
     dominant = user.get("prakriti", {}).get("dominant", "Vata")
     
     # Refresh tasks based on high Dosha percentage
@@ -527,7 +556,7 @@ async def reset_week(phone: str):
     
     await user_collection.update_one(
         {"phone": phone},
-        {"$set": {"weekly_tasks": new_tasks, "ojas_score": 40}}
+        [{"$set": {"weekly_tasks": {"$literal": new_tasks}}}, *ledger_stages("reset_week", 40)]
     )
     return {"status": "success", "message": "Dinacharya Reset"}
 
@@ -536,7 +565,7 @@ from datetime import datetime, timedelta
 
 @app.get("/weekly_summary/{phone}")
 async def get_weekly_summary(phone: str):
-    user = await user_collection.find_one({"phone": phone})
+    user = await find_user(phone, "tasks")
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -562,46 +591,60 @@ async def get_weekly_summary(phone: str):
 
 
 from fastapi import FastAPI, HTTPException, Body
-from google import genai
-from google.genai import types
 import os
-import json
 
 
 from database import database as db, user_collection, user_helper
 history_collection = db.get_collection("recipe_history")
-# 2. CLIENT CONFIGURATION (Direct Key for Local Stability)
-# Forced v1beta for JSON Schema support with developer keys
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = genai.Client(
-    api_key=GEMINI_API_KEY,
-    http_options={'api_version': 'v1beta'}
-)
+history_writer = WriteBehindBuffer(history_collection, "recipe_history")
+# 2. CLIENT CONFIGURATION lives in llm.py (lazy: built on first use or by the startup warm-up)
 
 # 3. BACKGROUND TASK: Save to History
-async def save_to_history(phone: str, ingredients: list, recipe: dict):
+async def save_to_history(phone: str, ingredients: list, recipe: dict, prakriti: str = None):
     """Saves a permanent log of the medicinal recipe."""
     try:
         history_entry = {
             "phone": phone,
             "timestamp": datetime.now(),
             "ingredients": ingredients,
+            "prakriti": prakriti,  # lets the offline index filter by constitution
             "recipe_name": recipe.get("recipe_name"),
             "full_recipe": recipe 
         }
-        await history_collection.insert_one(history_entry)
-        print(f"✅ History saved for {phone}: {recipe.get('recipe_name')}")
+        # Buffered: flushed with insert_many in batches (see history_writer.py)
+        await history_writer.enqueue(history_entry)
+        # Keep the offline retrieval engine current without a rebuild
+        recipe_index.add(ingredients, recipe, prakriti)
+        print(f"✅ History queued for {phone}: {recipe.get('recipe_name')}")
     except Exception as e:
         print(f"❌ History Save Error: {e}")
 
-# 4. ENHANCED RECIPE GENERATOR
-# 3. THE "GOLD STANDARD" RECIPE ROUTE
-@app.post("/generate_recipe/{phone}")
-async def generate_recipe(phone: str, bg_tasks: BackgroundTasks, ingredients: list = Body(...)):
-    print(f"\n--- 🍳 VAIDYA AI KITCHEN DEBUG ---")
-    
-    # A. Fetch clinical data
-    user = await user_collection.find_one({"phone": phone})
+# Failover order; model_router re-ranks it per request by health and latency
+RECIPE_MODELS = ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-flash-latest"]
+recipe_router = ModelRouter(RECIPE_MODELS)
+recipe_flights = SingleFlight()
+# Serve close matches from past recipes before calling Gemini (fallback is always on)
+RECIPE_LOCAL_FIRST = os.getenv("RECIPE_LOCAL_FIRST", "0") == "1"
+RECIPE_LOCAL_FIRST_OVERLAP = float(os.getenv("RECIPE_LOCAL_FIRST_OVERLAP", "1.0"))
+
+RECIPE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "recipe_name": {"type": "STRING"},
+        "ayurvedic_benefit": {"type": "STRING"},
+        "instructions": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "youtube_query": {"type": "STRING"},
+        "ojas_impact": {"type": "INTEGER"}
+    },
+    "required": ["recipe_name", "ayurvedic_benefit", "instructions"],
+    # Generation order matters for streaming: name first, then benefit, then steps
+    "propertyOrdering": ["recipe_name", "ayurvedic_benefit", "instructions", "youtube_query", "ojas_impact"]
+}
+
+async def load_recipe_context(phone: str, ingredients: list) -> dict:
+    """Fetches clinical data and builds the prompt + cache fingerprint shared by both recipe routes."""
+    # A. Fetch clinical data (projected: no tasks, logs or full histories)
+    user = await find_user(phone, "recipe_context")
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -634,48 +677,206 @@ STRICT REQUIREMENTS:
 Return ONLY JSON.
 """
 
-    # C. Resilient Model Failover Logic
-    # Based on your 'list_my_models' results
-    models_to_try = ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-flash-latest"]
-    
-    for model_id in models_to_try:
-        try:
-            print(f"🚀 Trying: {model_id}")
-            response = client.models.generate_content(
-                model=model_id,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    response_schema={
-                        "type": "OBJECT",
-                        "properties": {
-                            "recipe_name": {"type": "STRING"},
-                            "ayurvedic_benefit": {"type": "STRING"},
-                            "instructions": {"type": "ARRAY", "items": {"type": "STRING"}},
-                            "youtube_query": {"type": "STRING"},
-                            "ojas_impact": {"type": "INTEGER"}
-                        },
-                        "required": ["recipe_name", "ayurvedic_benefit", "instructions"]
-                    }
-                )
-            )
-            
-            recipe_data = json.loads(response.text)
-            print(f"✅ AI SUCCESS: {model_id} generated {recipe_data.get('recipe_name')}")
-            
-            # Background history sync
-            bg_tasks.add_task(save_to_history, phone, ingredients, recipe_data)
-            
-            return {"status": "success", "data": recipe_data}
+    return {
+        "prakriti": prakriti,
+        "agni": agni,
+        "conditions": conditions,
+        "allergies": allergies,
+        "prompt": prompt,
+        # Same profile + same ingredient set = same recipe
+        "fingerprint": recipe_fingerprint(prakriti, agni, conditions, allergies, ingredients)
+    }
 
-        except Exception as e:
-            if "429" in str(e) or "404" in str(e):
-                print(f"⚠️ {model_id} busy/missing. Retrying fallback...")
-                continue 
-            print(f"🚨 CRITICAL ERROR on {model_id}: {e}")
-            continue
+# 4. ENHANCED RECIPE GENERATOR
+# 3. THE "GOLD STANDARD" RECIPE ROUTE
+@app.post("/generate_recipe/{phone}")
+async def generate_recipe(phone: str, bg_tasks: BackgroundTasks, ingredients: list = Body(...)):
+    print(f"\n--- 🍳 VAIDYA AI KITCHEN DEBUG ---")
+    ctx = await load_recipe_context(phone, ingredients)
+    fingerprint = ctx["fingerprint"]
+
+    # Cache hit skips the paid LLM call
+    cached = recipe_cache.get(fingerprint)
+    if cached is not None:
+        print(f"♻️ CACHE HIT: {cached.get('recipe_name')}")
+        bg_tasks.add_task(save_to_history, phone, ingredients, cached, ctx["prakriti"])
+        return {"status": "success", "data": cached}
+
+    # Optional first tier: serve a close match from past recipes without calling the LLM
+    if RECIPE_LOCAL_FIRST:
+        local = recipe_index.search(ingredients, ctx["prakriti"], ctx["allergies"], RECIPE_LOCAL_FIRST_OVERLAP)
+        if local is not None:
+            print(f"📚 LOCAL HIT: {local.get('recipe_name')}")
+            return {"status": "success", "data": local, "source": "offline_index"}
+
+    # C. Identical in-flight requests (retries, same-profile family members) share one LLM call
+    try:
+        recipe_data = await recipe_flights.do(fingerprint, lambda: generate_with_failover(ctx["prompt"], fingerprint))
+    except HTTPException as e:
+        # D. LLM saturated: fall back to the offline retrieval engine before giving up
+        local = recipe_index.search(ingredients, ctx["prakriti"], ctx["allergies"]) if e.status_code == 429 else None
+        if local is None:
+            raise
+        print(f"📚 OFFLINE FALLBACK: {local.get('recipe_name')}")
+        return {"status": "success", "data": local, "source": "offline_index"}
+
+    # Background history sync
+    bg_tasks.add_task(save_to_history, phone, ingredients, recipe_data, ctx["prakriti"])
+
+    return {"status": "success", "data": recipe_data}
+
+def replay_recipe_events(recipe: dict, source: str = "cache"):
+    """A finished recipe as the same SSE sequence a live stream produces."""
+    yield sse("recipe_name", recipe.get("recipe_name"))
+    yield sse("ayurvedic_benefit", recipe.get("ayurvedic_benefit"))
+    for i, step in enumerate(recipe.get("instructions", [])):
+        yield sse("instruction", {"index": i, "value": step})
+    yield sse("done", {**recipe, "source": source})
+
+# STREAMING VARIANT: Server-Sent Events, fields pushed as soon as Gemini finishes each one
+@app.post("/generate_recipe_stream/{phone}")
+async def generate_recipe_stream(phone: str, ingredients: list = Body(...)):
+    ctx = await load_recipe_context(phone, ingredients)
+    fingerprint = ctx["fingerprint"]
+
+    async def events():
+        cached = recipe_cache.get(fingerprint)
+        if cached is not None:
+            for frame in replay_recipe_events(cached):
+                yield frame
+            await save_to_history(phone, ingredients, cached, ctx["prakriti"])
+            return
+
+        models_to_try = recipe_router.order()
+        try:
+            for model_id in models_to_try:
+                parser = PartialRecipeParser()
+                clock = CallClock()
+                emitted = False
+                try:
+                    print(f"🚀 Streaming: {model_id}")
+                    async for chunk in stream_json_text(model_id, ctx["prompt"], RECIPE_SCHEMA, clock=clock):
+                        for field, value in parser.feed(chunk):
+                            emitted = True
+                            yield sse(field, value)
+                    recipe_data = parser.result()
+                except HTTPException as e:
+                    local = recipe_index.search(ingredients, ctx["prakriti"], ctx["allergies"])
+                    if local is not None:
+                        for frame in replay_recipe_events(local, source="offline_index"):
+                            yield frame
+                        return
+                    yield sse("error", {"detail": e.detail})
+                    return
+                except Exception as e:
+                    kind = classify_error(e)
+                    recipe_router.record_failure(model_id, kind, clock.elapsed())
+                    print(f"⚠️ {model_id} stream {kind}: {e}")
+                    if emitted:
+                        # Client already has partial output from this model; can't splice another in
+                        yield sse("error", {"detail": "Recipe generation interrupted. Please retry."})
+                        return
+                    continue
+
+                recipe_router.record_success(model_id, clock.elapsed())
+                recipe_cache.put(fingerprint, recipe_data)
+                print(f"✅ AI STREAM SUCCESS: {model_id} generated {recipe_data.get('recipe_name')}")
+                yield sse("done", recipe_data)
+                await save_to_history(phone, ingredients, recipe_data, ctx["prakriti"])
+                return
+        finally:
+            for model_id in models_to_try:
+                recipe_router.release(model_id)
+
+        local = recipe_index.search(ingredients, ctx["prakriti"], ctx["allergies"])
+        if local is not None:
+            for frame in replay_recipe_events(local, source="offline_index"):
+                yield frame
+            return
+        yield sse("error", {"detail": "All AI models are busy. Wait 30s."})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def generate_with_failover(prompt: str, fingerprint: str) -> dict:
+    """Resilient Model Failover Logic: one shared call per fingerprint (see recipe_flights)."""
+    # Router skips models with an open breaker and tries the fastest healthy one first
+    models_to_try = recipe_router.order()
+    
+    try:
+        for model_id in models_to_try:
+            # Router latency covers the call only, not client import or waiting for a slot
+            clock = CallClock()
+            try:
+                print(f"🚀 Trying: {model_id}")
+                # Async client behind a bounded semaphore + timeout; other routes keep serving
+                recipe_data = await generate_json(model_id, prompt, RECIPE_SCHEMA, clock=clock)
+                recipe_router.record_success(model_id, clock.elapsed())
+                recipe_cache.put(fingerprint, recipe_data)
+                print(f"✅ AI SUCCESS: {model_id} generated {recipe_data.get('recipe_name')}")
+                return recipe_data
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                recipe_router.record_failure(model_id, kind, clock.elapsed())
+                if kind == "error":
+                    print(f"🚨 CRITICAL ERROR on {model_id}: {e}")
+                else:
+                    print(f"⚠️ {model_id} {kind}. Retrying fallback...")
+                continue
+    finally:
+        # Free half-open probe slots for models this request never reached
+        for model_id in models_to_try:
+            recipe_router.release(model_id)
 
     raise HTTPException(status_code=429, detail="All AI models are busy. Wait 30s.")
+
+@app.get("/admin/recipe_cache")
+async def recipe_cache_stats():
+    return {"status": "success", "data": {**recipe_cache.stats(), "single_flight": recipe_flights.stats()}}
+
+@app.get("/admin/recipe_index")
+async def recipe_index_stats():
+    return {"status": "success", "data": recipe_index.stats()}
+
+@app.get("/admin/history_writer")
+async def history_writer_stats():
+    return {"status": "success", "data": history_writer.stats()}
+
+@app.get("/admin/knowledge")
+async def knowledge_stats():
+    return {"status": "success", "data": knowledge_store.stats()}
+
+@app.post("/admin/knowledge/reload")
+async def reload_knowledge(force: bool = False):
+    """Re-read ayu_knowledge.json and ayushQnA.json; in-flight requests finish on the old version."""
+    return {"status": "success", "data": await knowledge_store.reload(force=force)}
+
+@app.get("/admin/auth")
+async def auth_stats():
+    return {"status": "success", "data": passwords.stats()}
+
+@app.get("/admin/ojas/{phone}")
+async def ojas_ledger_audit(phone: str):
+    """Replays the user's Ojas ledger and checks it against the stored score."""
+    user = await find_user(phone, "ojas_ledger")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    log = user.get("ojas_log", [])
+    return {"status": "success", "data": {**audit_log(log, user.get("ojas_score")), "log": log}}
+
+@app.get("/admin/indexes")
+async def index_health():
+    """Declared indexes that are missing, undeclared ones, and ones with no use since the server started."""
+    return {"status": "success", "data": await index_report(database)}
+
+@app.get("/admin/llm_models")
+async def llm_model_health():
+    """Circuit-breaker state and rolling latency per recipe model."""
+    return {"status": "success", "data": recipe_router.snapshot()}
+
 # 5. RECIPE HISTORY LOG
 @app.get("/recipe_history/{phone}")
 async def get_recipe_history(phone: str):
@@ -691,12 +892,22 @@ async def get_recipe_history(phone: str):
             
     return {"status": "success", "data": history}
 
+# 6. BUCKETED HISTORIES: meals, assessments, growth over a time range
+@app.get("/history/{phone}/{kind}")
+async def get_history_range(phone: str, kind: str, start: datetime = None, end: datetime = None, limit: int = 50):
+    """Entries with start <= time < end (ISO datetimes, both optional), newest first."""
+    if kind not in HISTORY_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown history '{kind}'. Use one of: {', '.join(HISTORY_KINDS)}")
+    events = await history_store.range(phone, kind, start, end, limit=max(1, min(limit, 500)))
+    return {"status": "success", "data": jsonable_encoder(events)}
+
 @app.get("/list_my_models")
 async def list_my_models():
     try:
         available_models = []
         # We'll print the first model's dir() to the terminal so you can see the real attributes
-        models = list(client.models.list())
+        # Sync SDK pager: iterate it on a worker thread, not the event loop
+        models = await asyncio.to_thread(lambda: list(get_client().models.list()))
         
         for m in models:
             # Most models support generate_content; we'll just list them all to be safe
@@ -708,9 +919,22 @@ async def list_my_models():
         return {"error": str(e)}
 
 # main.py
+# READINESS PROBE: load balancer should only route traffic once every subsystem is "ready"
 @app.get("/health")
 async def health_check():
-    return {"status": "ready", "timestamp": datetime.now().isoformat()}
+    snapshot = knowledge_store.current
+    subsystems = {
+        "knowledge": "ready" if snapshot.knowledge.foods and snapshot.chat.payloads else "failed",
+        "vision": vision_engine.status,
+        "llm": llm_status()
+    }
+    states = set(subsystems.values())
+    if states == {"ready"}:
+        status = "ready"
+    else:
+        status = next(s for s in ("failed", "starting", "warming") if s in states)
+    body = {"status": status, "subsystems": subsystems, "timestamp": datetime.now().isoformat()}
+    return JSONResponse(status_code=200 if status == "ready" else 503, content=body)
 
 @app.post("/update_profile/{phone}")
 async def update_profile(phone: str, profile_data: dict = Body(...)):
@@ -721,7 +945,7 @@ async def update_profile(phone: str, profile_data: dict = Body(...)):
     print(f"🔄 UPDATING PROFILE for: {phone}")
     
     # 1. Verify User exists
-    user = await user_collection.find_one({"phone": phone})
+    user = await find_user(phone, "health_profile")
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -767,12 +991,12 @@ class ScanSubmission(BaseModel):
 # Gets the specific "Vaidya Question" for the UI bubble
 @app.post("/get_audit_question")
 async def get_audit_question(request: AuditRequest):
-    item = ayu_db["food_wisdom"].get(request.food_id)
+    item = knowledge_store.current.knowledge.food(request.food_id)
     
     if not item:
         raise HTTPException(status_code=404, detail="Food item not found in knowledge base")
     
-    audit_data = item.get("deep_audit", {}).get(request.source)
+    audit_data = item.audit(request.source)
     
     if not audit_data:
         # Fallback if no specific audit exists
@@ -795,8 +1019,10 @@ async def get_audit_question(request: AuditRequest):
 @app.post("/submit_scan_result")
 async def submit_scan_result(data: ScanSubmission):
     print(f"\n--- 🥗 CLINICAL SCAN: {data.phone} ---")
+    # One snapshot for the whole verdict, even if the knowledge base is reloaded meanwhile
+    knowledge = knowledge_store.current.knowledge
     
-    user = await user_collection.find_one({"phone": data.phone})
+    user = await find_user(data.phone, "dosha")
     user_prakriti = user.get("prakriti", {}).get("dominant", "Vata")
     
     full_plate_ids = [data.food_id] + data.other_items
@@ -808,34 +1034,32 @@ async def submit_scan_result(data: ScanSubmission):
 
     # 1. Analyze Ingredients (Dosha Impact)
     for f_id in full_plate_ids:
-        info = ayu_db["food_wisdom"].get(f_id)
-        if not info: continue
+        food = knowledge.food(f_id)
+        if not food: continue
         
-        # Check Dosha
+        # Check Dosha (flags parsed once at load)
         is_compatible = True
         risk_msg = ""
-        if user_prakriti.lower() in info.get("dosha", "").lower() and "aggravating" in info.get("dosha", "").lower():
+        if user_prakriti.lower() in food.doshas and food.is_aggravating:
             is_compatible = False
             risk_msg = f"Aggravates {user_prakriti}"
             total_ojas_change -= 3
-        elif "pacifying" in info.get("dosha", "").lower():
+        elif food.is_pacifying:
             total_ojas_change += 2
             
         plate_analysis.append({
-            "name": info["name"],
+            "name": food.name,
             "is_compatible": is_compatible,
             "risk_msg": risk_msg
         })
 
         # NEW: Check if THIS item requires a timer in this context
-        item_audit = info.get("deep_audit", {}).get(data.source, {})
-        if item_audit.get("feedback_timer_required", False):
+        if food.audit(data.source).get("feedback_timer_required", False):
             any_timer_required = True
-            print(f"⏰ Timer Triggered by: {info['name']}")
+            print(f"⏰ Timer Triggered by: {food.name}")
 
     # 2. Apply Source/Quality Audit (Main Item Only)
-    main_item_info = ayu_db["food_wisdom"].get(data.food_id)
-    audit_logic = main_item_info["deep_audit"].get(data.source, {})
+    audit_logic = knowledge.food(data.food_id).audit(data.source)
     
     if data.is_positive:
         total_ojas_change += audit_logic.get("ojas_bonus", 5)
@@ -844,14 +1068,12 @@ async def submit_scan_result(data: ScanSubmission):
         total_ojas_change += audit_logic.get("ojas_penalty", -5)
         quality_verdict = "Tamasic (Heavy)"
 
-    # 3. Viruddha Check
-    warnings = []
-    current_plate_set = set(full_plate_ids)
-    for rule in ayu_db.get("viruddha_ahara_logic", []):
-        if set(rule["items"]).issubset(current_plate_set):
-            warnings.append(rule["reason"])
-            total_ojas_change -= 10
-            quality_verdict = "Viruddha (Incompatible)"
+    # 3. Viruddha Check (indexed rule engine: only rules anchored on this plate's items are tested)
+    viruddha_hits = knowledge.viruddha.check(full_plate_ids)
+    warnings = [hit["reason"] for hit in viruddha_hits]
+    if viruddha_hits:
+        total_ojas_change -= 10 * len(viruddha_hits)
+        quality_verdict = "Viruddha (Incompatible)"
 
     # 4. Set Timer based on ANY item flag
     #feedback_time = datetime.now() + timedelta(hours=2) if any_timer_required else None
@@ -869,17 +1091,15 @@ async def submit_scan_result(data: ScanSubmission):
         "feedback_collected": False
     }
 
-    # Update User Ojas
-    current_ojas = user.get("ojas_score", 50)
-    new_ojas = max(0, min(100, current_ojas + total_ojas_change))
-
-    await user_collection.update_one(
-        {"phone": data.phone},
-        {
-            "$push": {"meal_history": meal_entry},
-            "$set": {"last_meal": meal_entry, "ojas_score": new_ojas}
-        }
+    # Update User Ojas: atomic clamped increment + ledger event, meal saved in the same update
+    # (user document keeps the recent meals; the full log goes to the weekly bucket once the user update landed)
+    new_ojas = await apply_ojas_delta(
+        user_collection, data.phone, total_ojas_change, "meal_scan",
+        set_fields={"last_meal": meal_entry},
+        set_exprs={"meal_history": append_recent("meal_history", meal_entry)}
     )
+    if new_ojas is not None:
+        await history_store.record(data.phone, "meals", meal_entry)
 
     return {
         "status": "success",
@@ -888,6 +1108,8 @@ async def submit_scan_result(data: ScanSubmission):
             "quality": quality_verdict,
             "ojas_update": total_ojas_change,
             "warnings": warnings,
+            "viruddha": viruddha_hits,
+            "viruddha_risk": ViruddhaEngine.max_risk(viruddha_hits),
             "new_total_ojas": new_ojas,
             "timer_set": any_timer_required # Now returns True if ANY item needs it
         }
@@ -905,7 +1127,7 @@ FEEDBACK_STRATEGY = {
 
 @app.get("/post_meal_status/{phone}")
 async def get_post_meal_questions(phone: str):
-    user = await user_collection.find_one({"phone": phone})
+    user = await find_user(phone, "last_meal")
     last_meal = user.get("last_meal", {})
     
     # 1. Check if feedback is actually due
@@ -919,13 +1141,10 @@ async def get_post_meal_questions(phone: str):
 
     # 2. Generate SMART Questions based on the Food Item
     food_id = last_meal.get("food_id") # Main item ID
-    item_info = ayu_db["food_wisdom"].get(food_id, {})
+    food = knowledge_store.current.knowledge.food(food_id)
     
-    # Extract Dosha keyword (e.g., "Pitta aggravating" -> "Pitta")
-    dosha_key = "General"
-    if "Pitta" in item_info.get("dosha", ""): dosha_key = "Pitta"
-    elif "Kapha" in item_info.get("dosha", ""): dosha_key = "Kapha"
-    elif "Vata" in item_info.get("dosha", ""): dosha_key = "Vata"
+    # Dosha keyword (e.g., "Pitta aggravating" -> "Pitta") is extracted once at load
+    dosha_key = food.feedback_dosha if food else "General"
     
     questions = FEEDBACK_STRATEGY.get(dosha_key, FEEDBACK_STRATEGY["General"])
 
@@ -944,22 +1163,15 @@ async def submit_feedback(phone: str, data: dict = Body(...)):
     """
     feeling = data.get("feeling") # "Good" or "Bad"
     
-    user = await user_collection.find_one({"phone": phone})
-    current_ojas = user.get("ojas_score", 50)
-    
     # Clinical Logic: If digestion was bad, apply penalty
     impact = -5 if feeling == "Bad" else +2
-    new_ojas = max(0, min(100, current_ojas + impact))
     
-    await user_collection.update_one(
-        {"phone": phone},
-        {
-            "$set": {
-                "ojas_score": new_ojas, 
-                "last_meal.feedback_collected": True,
-                "last_meal.digestion_result": feeling
-            }
-        }
+    # One atomic update: clamped Ojas change, ledger event and feedback flags
+    new_ojas = await apply_ojas_delta(
+        user_collection, phone, impact, "meal_feedback",
+        set_fields={"last_meal.feedback_collected": True, "last_meal.digestion_result": feeling}
     )
+    if new_ojas is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
     return {"status": "success", "new_ojas": new_ojas}
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+One-off migration: move embedded user histories into history_buckets.
+
+Usage (from backend/, with MONGO_URL set):
+    python migrate_histories.py [--batch-size 200] [--dry-run]
+Streams users that are not on history_version 2 in batches, copies every
+meal/assessment/growth entry into its weekly bucket, then trims the embedded arrays
+to the newest HISTORY_RECENT_SIZE entries. Bucket writes use $addToSet, so an
+interrupted run can simply be started again.
+Safe to run any time after deploy: until a user is migrated, live writes append to
+both the untrimmed embedded arrays and the buckets, and $addToSet skips those duplicates.
+"""
+import asyncio
+import argparse
+import time
+
+from pymongo import UpdateOne
+
+from database import database, user_collection
+from history_store import HistoryStore, HISTORY_KINDS, HISTORY_RECENT_SIZE
+
+
+async def migrate(batch_size: int, dry_run: bool):
+    store = HistoryStore(database.get_collection("history_buckets"))
+    fields = [field for field, _ in HISTORY_KINDS.values()]
+    cursor = user_collection.find(
+        {"history_version": {"$ne": 2}},
+        {"phone": 1, **{field: 1 for field in fields}}
+    ).batch_size(batch_size)
+
+    users = entries = 0
+    bucket_ops, user_ops = [], []
+    started = time.perf_counter()
+
+    async def flush():
+        if dry_run:
+            bucket_ops.clear()
+            user_ops.clear()
+            return
+        # Buckets first: a user is only trimmed once its entries are safely copied
+        if bucket_ops:
+            await store.collection.bulk_write(bucket_ops, ordered=False)
+        if user_ops:
+            await user_collection.bulk_write(user_ops, ordered=False)
+        bucket_ops.clear()
+        user_ops.clear()
+
+    async for user in cursor:
+        phone = user.get("phone")
+        if not phone:
+            continue
+        for kind, (field, _) in HISTORY_KINDS.items():
+            history = [e for e in user.get(field) or [] if isinstance(e, dict)]
+            if history:
+                bucket_ops.extend(store.bucket_op(phone, kind, history, dedupe=True))
+                entries += len(history)
+        user_ops.append(UpdateOne(
+            {"_id": user["_id"]},
+            {
+                "$push": {field: {"$each": [], "$slice": -HISTORY_RECENT_SIZE} for field in fields},
+                "$set": {"history_version": 2}
+            }
+        ))
+        users += 1
+        if len(user_ops) >= batch_size:
+            await flush()
+            print(f"📦 {users} users / {entries} entries migrated ({time.perf_counter() - started:.1f}s)")
+
+    await flush()
+    print(f"✅ Done{' (dry run)' if dry_run else ''}: {users} users, {entries} entries in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move embedded user histories into weekly buckets")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "20"))
+LLM_COOLDOWN_S = float(os.getenv("LLM_COOLDOWN_S", "30"))
+# A missing model (404) will not come back in 30s; keep it out much longer
+LLM_NOT_FOUND_COOLDOWN_S = float(os.getenv("LLM_NOT_FOUND_COOLDOWN_S", "600"))
+# Generic errors only trip the breaker after this many in a row
+LLM_ERROR_THRESHOLD = int(os.getenv("LLM_ERROR_THRESHOLD", "3"))
+
+# Failures that open the breaker immediately, with their cooldown
+TRIP_NOW = {"rate_limited": LLM_COOLDOWN_S, "timeout": LLM_COOLDOWN_S, "not_found": LLM_NOT_FOUND_COOLDOWN_S}
+
+
+def classify_error(e: Exception) -> str:
+    if isinstance(e, asyncio.TimeoutError):
+        return "timeout"
+    text = str(e)
+    if "429" in text or "RESOURCE_EXHAUSTED" in text:
+        return "rate_limited"
+    if "404" in text or "NOT_FOUND" in text:
+        return "not_found"
+    return "error"
+
+
+class ModelHealth:
+    """Rolling stats + circuit breaker (closed -> open -> half_open -> closed) for one model."""
+
+    def __init__(self, model_id: str, window: int):
+        self.model_id = model_id
+        self.calls = deque(maxlen=window)  # (ok, latency_s)
+        self.state = "closed"
+        self.open_until = 0.0
+        self.consecutive_errors = 0
+        self.last_error = None
+        self.probing = False
+
+    def avg_latency(self):
+        latencies = [lat for ok, lat in self.calls if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def success_rate(self):
+        return sum(1 for ok, _ in self.calls if ok) / len(self.calls) if self.calls else None
+
+    def available(self, now: float) -> bool:
+        if self.state == "open" and now >= self.open_until:
+            self.state = "half_open"
+        if self.state == "half_open":
+            # Exactly one trial request is let through after the cooldown
+            return not self.probing
+        return self.state == "closed"
+
+
+class ModelRouter:
+    """
+    Orders the failover list per request: healthy models first, fastest (rolling mean latency) first,
+    models with an open breaker skipped until their cooldown ends.
+    """
+
+    def __init__(self, models: list, window: int = LLM_STATS_WINDOW):
+        self.models = list(models)
+        self.health = {m: ModelHealth(m, window) for m in self.models}
+
+    def order(self) -> list:
+        now = time.monotonic()
+        candidates = [m for m in self.models if self.health[m].available(now)]
+        # Unknown latency sorts as 0 so untried models still get sampled; ties keep configured order
+        ranked = sorted(candidates, key=lambda m: (self.health[m].state != "closed",
+                                                    self.health[m].avg_latency() or 0.0))
+        for m in ranked:
+            if self.health[m].state == "half_open":
+                self.health[m].probing = True
+        return ranked
+
+    def record_success(self, model_id: str, latency: float):
+        h = self.health[model_id]
+        h.calls.append((True, latency))
+        h.state = "closed"
+        h.probing = False
+        h.consecutive_errors = 0
+
+    def record_failure(self, model_id: str, kind: str, latency: float = 0.0):
+        h = self.health[model_id]
+        h.calls.append((False, latency))
+        h.probing = False
+        h.last_error = kind
+        h.consecutive_errors += 1
+        cooldown = TRIP_NOW.get(kind)
+        if cooldown is None and (h.state == "half_open" or h.consecutive_errors >= LLM_ERROR_THRESHOLD):
+            cooldown = LLM_COOLDOWN_S
+        if cooldown is not None:
+            h.state = "open"
+            h.open_until = time.monotonic() + cooldown
+            print(f"🔌 Breaker OPEN for {model_id} ({kind}) for {cooldown:.0f}s")
+
+    def release(self, model_id: str):
+        # Request ended before this model was tried (an earlier one answered): free its probe slot
+        self.health[model_id].probing = False
+
+    def snapshot(self) -> list:
+        now = time.monotonic()
+        out = []
+        for m in self.models:
+            h = self.health[m]
+            h.available(now)  # refresh open -> half_open
+            latency = h.avg_latency()
+            rate = h.success_rate()
+            out.append({
+                "model": m,
+                "state": h.state,
+                "cooldown_left_s": round(max(0.0, h.open_until - now), 1) if h.state == "open" else 0.0,
+                "avg_latency_ms": round(latency * 1000, 1) if latency is not None else None,
+                "success_rate": round(rate, 3) if rate is not None else None,
+                "calls_in_window": len(h.calls),
+                "consecutive_errors": h.consecutive_errors,
+                "last_error": h.last_error
+            })
+        return out
@@ -0,0 +1,73 @@
+import os
+
+from pymongo import ReturnDocument
+
+OJAS_MIN, OJAS_MAX = 0, 100
+# Score assumed for users created before ojas_score existed (what the routes always defaulted to)
+OJAS_DEFAULT = 50
+# Events kept in each user's embedded ojas_log; older ones are dropped
+OJAS_LOG_SIZE = int(os.getenv("OJAS_LOG_SIZE", "200"))
+
+
+def _clamp(expr) -> dict:
+    return {"$min": [OJAS_MAX, {"$max": [OJAS_MIN, expr]}]}
+
+
+def ledger_stages(reason: str, new_score, delta=None) -> list:
+    """
+    Update-pipeline stages that set ojas_score to `new_score` (clamped; an expression that
+    may use "$_ojas_prev") and append {at, why, delta, from, to} to the capped ojas_log.
+    Everything happens inside one update, so concurrent changes never overwrite each other.
+    """
+    return [
+        {"$set": {"_ojas_prev": {"$ifNull": ["$ojas_score", OJAS_DEFAULT]}}},
+        {"$set": {"ojas_score": _clamp(new_score)}},
+        {"$set": {"ojas_log": {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$ojas_log", []]}, [{
+                "at": "$$NOW",
+                "why": {"$literal": reason},
+                # Requested change; the clamped effect is to - from
+                "delta": {"$literal": delta} if delta is not None else {"$subtract": ["$ojas_score", "$_ojas_prev"]},
+                "from": "$_ojas_prev",
+                "to": "$ojas_score"
+            }]]},
+            -OJAS_LOG_SIZE
+        ]}}},
+        {"$unset": "_ojas_prev"}
+    ]
+
+
+async def apply_ojas_delta(collection, phone: str, delta: int, reason: str,
+                           set_fields: dict = None, set_exprs: dict = None):
+    """
+    Atomic clamped increment in one round trip. `set_fields` (literal values) and `set_exprs`
+    (pipeline expressions, e.g. history_store.append_recent) are written in the same update;
+    dotted paths are allowed. Returns the new score, or None for an unknown phone.
+    """
+    changes = {field: {"$literal": value} for field, value in (set_fields or {}).items()}
+    changes.update(set_exprs or {})
+
+    pipeline = ([{"$set": changes}] if changes else []) + ledger_stages(reason, {"$add": ["$_ojas_prev", delta]}, delta)
+    user = await collection.find_one_and_update(
+        {"phone": phone},
+        pipeline,
+        projection={"_id": 0, "ojas_score": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return user["ojas_score"] if user else None
+
+
+def audit_log(events: list, score) -> dict:
+    """Checks the log is an unbroken chain (each `from` is the previous `to`) ending at the stored score."""
+    breaks = [
+        i for i in range(1, len(events))
+        if events[i].get("from") != events[i - 1].get("to")
+    ]
+    rebuilt = events[-1]["to"] if events else None
+    return {
+        "events": len(events),
+        "rebuilt_score": rebuilt,
+        "stored_score": score,
+        "consistent": not breaks and (rebuilt is None or rebuilt == score),
+        "chain_breaks_at": breaks
+    }
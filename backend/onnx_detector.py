@@ -0,0 +1,138 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+SCAN_INTRA_OP_THREADS = int(os.getenv("SCAN_INTRA_OP_THREADS", "0"))  # 0 = let onnxruntime decide
+SCAN_CONF = float(os.getenv("SCAN_CONF", "0.25"))
+SCAN_IOU = float(os.getenv("SCAN_IOU", "0.7"))
+
+
+def onnx_path_for(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".onnx"
+
+
+def weights_fingerprint(model_path: str, imgsz: int) -> str:
+    """sha256 of the .pt weights plus the export size; stored beside the .onnx it was exported from."""
+    h = hashlib.sha256(f"imgsz={imgsz}\n".encode())
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def ensure_onnx_export(model_path: str, imgsz: int = 640) -> str:
+    """
+    Exports the ultralytics .pt weights to ONNX next to them and returns the .onnx path.
+    Re-exports whenever the weights (or imgsz) differ from what the existing .onnx was built from.
+    """
+    onnx_path = onnx_path_for(model_path)
+    source_path = onnx_path + ".source"
+    # Without preload every worker gets here; one exports under the lock, the others wait and reuse it
+    with open(onnx_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        fingerprint = weights_fingerprint(model_path, imgsz)
+        if os.path.exists(onnx_path):
+            try:
+                with open(source_path) as f:
+                    built_from = f.read().strip()
+            except FileNotFoundError:
+                built_from = None
+            if built_from == fingerprint:
+                return onnx_path
+            print(f"⚠️ {onnx_path} was not exported from the current {model_path}; re-exporting")
+        from ultralytics import YOLO
+        print(f"📦 Exporting {model_path} -> ONNX...")
+        # Export a scratch copy, then rename: onnx_path never exists half-written, even after a crash
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(onnx_path) or ".") as scratch:
+            staged = shutil.copy(model_path, scratch)
+            # dynamic=True keeps the batch axis free so micro-batches run as one call
+            exported = YOLO(staged).export(format="onnx", imgsz=imgsz, dynamic=True)
+            os.replace(exported, onnx_path)
+            # Sidecar written last: a crash in between just means one more export next start
+            staged_source = os.path.join(scratch, "source")
+            with open(staged_source, "w") as f:
+                f.write(fingerprint)
+            os.replace(staged_source, source_path)
+    return onnx_path
+
+
+def letterbox(image: np.ndarray, size: int) -> np.ndarray:
+    """Resizes a BGR array to fit size x size (up or down) and pads it centred, like YOLO's LetterBox."""
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    if (nh, nw) != (h, w):
+        from PIL import Image
+        image = np.asarray(Image.fromarray(image).resize((nw, nh), Image.BILINEAR))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    # Same rounding as ultralytics: odd padding puts the extra pixel bottom/right
+    top, left = int(round((size - nh) / 2 - 0.1)), int(round((size - nw) / 2 - 0.1))
+    canvas[top:top + nh, left:left + nw] = image
+    return canvas
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> list:
+    """Plain greedy NMS over xyxy boxes; returns kept indices by descending score."""
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return keep
+
+
+class OnnxDetector:
+    """
+    Runs the exported detector with onnxruntime on CPU.
+    Mirrors the ultralytics post-processing (conf filter + class-aware NMS) and returns class IDs only.
+    """
+
+    def __init__(self, onnx_path: str, imgsz: int = 640, intra_op_threads: int = SCAN_INTRA_OP_THREADS,
+                 conf: float = SCAN_CONF, iou: float = SCAN_IOU):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+
+    def _postprocess(self, pred: np.ndarray) -> list:
+        # pred: (4 + num_classes, anchors) -> rows of [cx, cy, w, h, class scores...]
+        pred = pred.T
+        scores = pred[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        mask = confidences > self.conf
+        if not mask.any():
+            return []
+        xywh, class_ids, confidences = pred[mask, :4], class_ids[mask], confidences[mask]
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+        # Class-aware NMS: offset boxes per class so different foods never suppress each other
+        offset = class_ids[:, None].astype(np.float32) * (self.imgsz * 2)
+        keep = nms(boxes + offset, confidences, self.iou)
+        return [int(class_ids[i]) for i in keep]
+
+    def __call__(self, sources: list) -> list:
+        batch = np.stack([letterbox(img, self.imgsz)[:, :, ::-1] for img in sources])  # BGR -> RGB
+        batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(pred) for pred in outputs]
@@ -0,0 +1,71 @@
+import os
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+# bcrypt cost factor for new hashes; existing hashes with another cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so these threads hash in parallel without touching the event loop
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+# Hashes running + waiting per worker process; beyond this, attempts are shed with 429
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "32"))
+
+_COST = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+_pool = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+_stats = {"hashed": 0, "verified": 0, "rehashed": 0, "shed": 0}
+
+
+async def _run(fn, *args):
+    # Counter is only touched from the event loop thread, so no lock is needed
+    global _pending
+    if _pending >= AUTH_MAX_PENDING:
+        _stats["shed"] += 1
+        raise HTTPException(status_code=429, detail="Too many login attempts. Please try again shortly.")
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+    finally:
+        _pending -= 1
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+async def hash_password(password: str) -> str:
+    hashed = await _run(_hash, password)
+    _stats["hashed"] += 1
+    return hashed
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    ok = await _run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+    _stats["verified"] += 1
+    return ok
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True when a stored hash was made with a different cost than BCRYPT_ROUNDS."""
+    match = _COST.match(hashed)
+    return match is None or int(match.group(1)) != BCRYPT_ROUNDS
+
+
+async def rehash_password(password: str) -> str:
+    hashed = await _run(_hash, password)
+    _stats["rehashed"] += 1
+    return hashed
+
+
+def stats() -> dict:
+    return {
+        "rounds": BCRYPT_ROUNDS,
+        "workers": AUTH_HASH_WORKERS,
+        "pending": _pending,
+        "max_pending": AUTH_MAX_PENDING,
+        **_stats
+    }
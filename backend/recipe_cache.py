@@ -0,0 +1,38 @@
+import os
+import re
+import json
+import hashlib
+
+from ttl_cache import TTLCache
+
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "2048"))
+RECIPE_CACHE_TTL_S = float(os.getenv("RECIPE_CACHE_TTL_S", str(6 * 3600)))
+
+
+def normalize_ingredient(name: str) -> str:
+    """'  Green Peas ' -> 'green pea', 'Tomatoes' -> 'tomato' so spelling variants share a cache key."""
+    text = re.sub(r"\s+", " ", str(name).strip().lower())
+    if text.endswith("oes") and len(text) > 4:
+        return text[:-2]
+    if text.endswith("s") and not text.endswith("ss") and len(text) > 3:
+        return text[:-1]
+    return text
+
+
+def normalize_terms(values) -> list:
+    return sorted({normalize_ingredient(v) for v in values or [] if str(v).strip()})
+
+
+def recipe_fingerprint(prakriti: str, agni: str, conditions: list, allergies: list, ingredients: list) -> str:
+    """Stable key for everything the recipe prompt depends on; order and case never matter."""
+    key = {
+        "prakriti": str(prakriti).strip().lower(),
+        "agni": str(agni).strip().lower(),
+        "conditions": normalize_terms(conditions),
+        "allergies": normalize_terms(allergies),
+        "ingredients": normalize_terms(ingredients)
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+recipe_cache = TTLCache(RECIPE_CACHE_SIZE, RECIPE_CACHE_TTL_S)
@@ -0,0 +1,180 @@
+import os
+import time
+import heapq
+from datetime import datetime
+from collections import defaultdict
+
+from recipe_cache import normalize_terms
+
+RECIPE_INDEX_MAX_DOCS = int(os.getenv("RECIPE_INDEX_MAX_DOCS", "20000"))
+# Share of the requested ingredients a stored recipe must cover to be served
+RECIPE_INDEX_MIN_OVERLAP = float(os.getenv("RECIPE_INDEX_MIN_OVERLAP", "0.5"))
+
+
+def _recipe_text(recipe: dict) -> str:
+    parts = [recipe.get("recipe_name", ""), *recipe.get("instructions", [])]
+    return " ".join(str(p) for p in parts).lower()
+
+
+class RecipeIndex:
+    """
+    In-memory retrieval engine over recipe_history: normalized ingredient -> stored recipes.
+    Answers in milliseconds with no LLM; used when every Gemini model is unavailable
+    (and optionally as the first tier).
+    """
+
+    def __init__(self, max_docs: int = RECIPE_INDEX_MAX_DOCS):
+        self.max_docs = max_docs
+        self.docs = {}  # doc_id -> {"key", "ingredients", "prakriti", "recipe", "text", "at"}
+        self.postings = defaultdict(set)  # ingredient -> {doc_id}
+        self._keys = {}  # dedupe key -> doc_id
+        # (at, doc_id) min-heap for eviction; entries whose "at" has since moved on are skipped lazily
+        self._by_age = []
+        self._seq = 0
+        self.status = "starting"
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, ingredients: list, recipe: dict, prakriti: str = None, at: datetime = None):
+        """
+        Incremental update: called for every saved history entry. `at` is the entry's timestamp
+        (now for live saves), so recency is the same whether an entry was loaded or added live.
+        """
+        if not recipe or not recipe.get("recipe_name"):
+            return
+        at = at if isinstance(at, datetime) else datetime.now()
+        terms = normalize_terms(ingredients)
+        key = (recipe["recipe_name"].strip().lower(), tuple(terms))
+        if key in self._keys:
+            # Same dish again: keep its most recent time
+            doc_id = self._keys[key]
+            doc = self.docs[doc_id]
+            if at > doc["at"]:
+                doc["at"] = at
+                heapq.heappush(self._by_age, (at, doc_id))
+            return
+        self._seq += 1
+        doc_id = self._seq
+        self._keys[key] = doc_id
+        self.docs[doc_id] = {
+            "key": key,
+            "ingredients": set(terms),
+            "prakriti": prakriti.lower() if prakriti else None,
+            "recipe": recipe,
+            "text": _recipe_text(recipe),
+            "at": at
+        }
+        heapq.heappush(self._by_age, (at, doc_id))
+        for term in terms:
+            self.postings[term].add(doc_id)
+        if len(self.docs) > self.max_docs:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        while True:
+            at, doc_id = heapq.heappop(self._by_age)
+            doc = self.docs.get(doc_id)
+            if doc is not None and doc["at"] == at:
+                break
+        del self.docs[doc_id]
+        del self._keys[doc["key"]]
+        for term in doc["ingredients"]:
+            self.postings[term].discard(doc_id)
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def search(self, ingredients: list, prakriti: str, allergies: list,
+               min_overlap: float = RECIPE_INDEX_MIN_OVERLAP):
+        """Best stored recipe for this ingredient set, or None. Never returns one touching an allergy."""
+        wanted = normalize_terms(ingredients)
+        if not wanted:
+            self.misses += 1
+            return None
+        blocked = normalize_terms(allergies)
+        prakriti = (prakriti or "").lower()
+
+        overlap = defaultdict(int)
+        for term in wanted:
+            for doc_id in self.postings.get(term, ()):
+                overlap[doc_id] += 1
+
+        best, best_rank = None, None
+        for doc_id, count in overlap.items():
+            if count / len(wanted) < min_overlap:
+                continue
+            doc = self.docs[doc_id]
+            if doc["prakriti"] and doc["prakriti"] != prakriti:
+                continue
+            if any(a in doc["ingredients"] or a in doc["text"] for a in blocked):
+                continue
+            # More shared ingredients first, then same-prakriti over unknown, then most recent
+            rank = (count, doc["prakriti"] == prakriti, doc["at"])
+            if best_rank is None or rank > best_rank:
+                best, best_rank = doc, rank
+
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return best["recipe"]
+
+    async def build(self, collection, users=None, batch_size: int = 1000):
+        """
+        Streams recipe_history from Mongo into the index (startup background task, off the request path).
+        Entries saved before prakriti was recorded get their user's current dominant dosha from `users`,
+        one projected $in lookup per batch of unseen phones.
+        """
+        started = time.perf_counter()
+        dominant = {}  # phone -> prakriti.dominant (None if the user is gone)
+        backfilled = 0
+
+        async def index_batch(batch):
+            nonlocal backfilled
+            phones = {e.get("phone") for e in batch if not e.get("prakriti")} - dominant.keys() - {None}
+            if phones and users is not None:
+                async for user in users.find({"phone": {"$in": list(phones)}}, {"_id": 0, "phone": 1, "prakriti.dominant": 1}):
+                    # Same default load_recipe_context uses when tagging new entries
+                    dominant[user["phone"]] = user.get("prakriti", {}).get("dominant", "Balanced")
+                dominant.update({phone: None for phone in phones - dominant.keys()})
+            for entry in batch:
+                prakriti = entry.get("prakriti")
+                if not prakriti:
+                    prakriti = dominant.get(entry.get("phone"))
+                    backfilled += prakriti is not None
+                # Entries without a usable timestamp rank (and are evicted) as the oldest
+                at = entry.get("timestamp")
+                self.add(entry.get("ingredients", []), entry.get("full_recipe"), prakriti,
+                         at if isinstance(at, datetime) else datetime.min)
+
+        try:
+            cursor = collection.find(
+                {},
+                {"phone": 1, "ingredients": 1, "full_recipe": 1, "prakriti": 1, "timestamp": 1, "_id": 0}
+            ).batch_size(batch_size)
+            batch = []
+            async for entry in cursor:
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    await index_batch(batch)
+                    batch = []
+            await index_batch(batch)
+            self.status = "ready"
+            print(f"📚 Recipe index built: {len(self.docs)} recipes, {len(self.postings)} ingredients "
+                  f"({backfilled} prakriti backfilled) in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            self.status = "failed"
+            print(f"❌ Recipe index build failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "status": self.status,
+            "recipes": len(self.docs),
+            "ingredients": len(self.postings),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+recipe_index = RecipeIndex()
@@ -0,0 +1,60 @@
+import re
+import json
+
+# A complete JSON string literal (escapes allowed); used to pick finished values out of a partial document
+_STRING = r'"((?:[^"\\]|\\.)*)"'
+_FIELDS = ("recipe_name", "ayurvedic_benefit", "youtube_query")
+_FIELD_PATTERNS = {f: re.compile(r'"%s"\s*:\s*%s' % (f, _STRING)) for f in _FIELDS}
+_INSTRUCTIONS_START = re.compile(r'"instructions"\s*:\s*\[')
+_ARRAY_ITEM = re.compile(r'\s*,?\s*' + _STRING)
+
+
+def sse(event: str, data) -> str:
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class PartialRecipeParser:
+    """
+    Pulls completed recipe fields out of a JSON document that is still being streamed.
+    feed() returns only what became complete since the previous call:
+    recipe_name / ayurvedic_benefit / youtube_query once their string closes, and each
+    instruction step as soon as its own string closes.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sent = set()
+        self.steps_sent = 0
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        events = []
+        for field, pattern in _FIELD_PATTERNS.items():
+            if field in self.sent:
+                continue
+            match = pattern.search(self.text)
+            if match:
+                self.sent.add(field)
+                events.append((field, json.loads(f'"{match.group(1)}"')))
+
+        start = _INSTRUCTIONS_START.search(self.text)
+        if start:
+            pos, index = start.end(), 0
+            while True:
+                match = _ARRAY_ITEM.match(self.text, pos)
+                if not match:
+                    break
+                if index >= self.steps_sent:
+                    events.append(("instruction", {"index": index, "value": json.loads(f'"{match.group(1)}"')}))
+                    self.steps_sent = index + 1
+                pos, index = match.end(), index + 1
+        return events
+
+    def result(self) -> dict:
+        """Final validation once the stream ends; raises ValueError if the document is unusable."""
+        recipe = json.loads(self.text)
+        missing = [k for k in ("recipe_name", "ayurvedic_benefit", "instructions") if not recipe.get(k)]
+        if missing:
+            raise ValueError(f"Recipe missing fields: {missing}")
+        return recipe
@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+import hashlib
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+from ttl_cache import TTLCache
+
+SCAN_CACHE_SIZE = int(os.getenv("SCAN_CACHE_SIZE", "1024"))
+SCAN_CACHE_TTL_S = float(os.getenv("SCAN_CACHE_TTL_S", "600"))
+# Near-duplicate matching is off by default: only byte-identical images hit.
+# When > 0: max differing bits (out of 256) between two photos' gradient hashes...
+SCAN_CACHE_MAX_DISTANCE = int(os.getenv("SCAN_CACHE_MAX_DISTANCE", "0"))
+# ...and max per-channel difference (0-255) of any cell of their 4x4 colour grids
+SCAN_CACHE_MAX_COLOR_DELTA = int(os.getenv("SCAN_CACHE_MAX_COLOR_DELTA", "12"))
+
+
+class ScanKey(NamedTuple):
+    digest: bytes       # exact content of the prepared array
+    dhash: int          # 256-bit gradient hash (structure)
+    colors: np.ndarray  # 4x4x3 mean colour grid (what is on the plate)
+
+
+def scan_key(image: np.ndarray, hash_size: int = 16) -> ScanKey:
+    """
+    Cache key for a prepared BGR array. Structure alone can't tell dal from curd in the
+    same bowl, so near matches also compare a coarse colour grid.
+    """
+    h = hashlib.blake2b(str(image.shape).encode(), digest_size=16)
+    h.update(image.tobytes())
+    digest = h.digest()
+    rgb = Image.fromarray(image[:, :, ::-1])
+    gray = rgb.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    colors = np.asarray(rgb.resize((4, 4), Image.BOX), dtype=np.int16)
+    return ScanKey(digest, int.from_bytes(np.packbits(bits).tobytes(), "big"), colors)
+
+
+class ScanCache(TTLCache):
+    """
+    Detector output keyed by exact image digest, with optional near-duplicate lookup
+    (gradient hash + colour grid) for retakes of the same plate. Thread-safe.
+    """
+
+    def __init__(self, max_size: int = SCAN_CACHE_SIZE, ttl: float = SCAN_CACHE_TTL_S,
+                 max_distance: int = SCAN_CACHE_MAX_DISTANCE, max_color_delta: int = SCAN_CACHE_MAX_COLOR_DELTA):
+        super().__init__(max_size, ttl)  # entries: digest -> (expires_at, (key, class_ids))
+        self.max_distance = max_distance
+        self.max_color_delta = max_color_delta
+        self.near_hits = 0
+        # Lookups run in threadpool threads (main.prepare_scan), puts on the event loop
+        self._lock = threading.Lock()
+
+    def _similar(self, a: ScanKey, b: ScanKey) -> bool:
+        return (bin(a.dhash ^ b.dhash).count("1") <= self.max_distance
+                and int(np.abs(a.colors - b.colors).max()) <= self.max_color_delta)
+
+    def get(self, key: ScanKey):
+        now = time.monotonic()
+        with self._lock:
+            found = self._take(key.digest, now)
+            if found is not None:
+                self.hits += 1
+                return found[1]
+            candidates = list(self._entries.items()) if self.max_distance > 0 else []
+        # The similarity scan runs outside the lock, over a snapshot of the entries
+        near = next((digest for digest, (expires_at, (other, _)) in candidates
+                     if expires_at > now and self._similar(key, other)), None)
+        with self._lock:
+            found = self._take(near, now) if near is not None else None
+            if found is not None:
+                self.near_hits += 1
+                return found[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: ScanKey, class_ids: list):
+        with self._lock:
+            super().put(key.digest, (key, class_ids))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                **super().stats(),
+                "near_hits": self.near_hits,
+                "hit_ratio": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0
+            }
+
+
+scan_cache = ScanCache()
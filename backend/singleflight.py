@@ -0,0 +1,28 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    De-duplicates concurrent calls by key: the first caller starts the work, everyone
+    arriving while it runs awaits the same task and gets the same result (or exception).
+    The work runs as its own task, so one client disconnecting never cancels it for the rest.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.followers}
@@ -0,0 +1,7 @@
+from database import user_collection
+from user_views import USER_VIEWS
+
+
+async def find_user(phone: str, view: str):
+    """One user by phone, projected to a named view; None if there is no such user."""
+    return await user_collection.find_one({"phone": phone}, USER_VIEWS[view])
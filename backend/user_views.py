@@ -0,0 +1,20 @@
+# Named projections: each route loads only the fields it reads instead of the whole user document
+# (which embeds tasks, recent histories and the Ojas log).
+USER_VIEWS = {
+    # /login: credentials + the fields echoed back to the app
+    "auth": {"_id": 0, "phone": 1, "password": 1, "fullname": 1, "onboarding_complete": 1, "prakriti": 1},
+    # /user_profile home card
+    "profile_card": {"_id": 0, "fullname": 1, "phone": 1, "gender": 1, "prakriti": 1,
+                     "onboarding_complete": 1, "ojas_score": 1, "weekly_tasks": 1, "current_day": 1},
+    # Dominant dosha only (diet advice, scan verdicts, week reset)
+    "dosha": {"_id": 0, "prakriti.dominant": 1},
+    # /weekly_summary: tasks, score and the last 7 growth points
+    "tasks": {"_id": 0, "weekly_tasks": 1, "ojas_score": 1, "growth_history": {"$slice": -7}},
+    "ojas_ledger": {"_id": 0, "ojas_score": 1, "ojas_log": 1},
+    # Recipe prompt: constitution, medical profile and the latest assessment's Agni
+    "recipe_context": {"_id": 0, "prakriti.dominant": 1, "health_profile.conditions": 1,
+                       "health_profile.allergies": 1, "assessment_history": {"$slice": -1}},
+    "health_profile": {"_id": 0, "health_profile": 1, "report_uploaded": 1},
+    "last_meal": {"_id": 0, "last_meal": 1},
+    "exists": {"_id": 1},
+}
@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+RISK_ORDER = {"Low": 0, "Moderate": 1, "High": 2, "Critical": 3}
+
+
+class ViruddhaEngine:
+    """
+    Viruddha Ahara (incompatible food) rules compiled for fast plate checks.
+
+    Every food ID gets a bit; each rule becomes a bitmask of its items. Each rule is filed
+    under a single anchor item (the one with the fewest rules so far) because a rule can only
+    match if its anchor is on the plate. A check therefore only looks at rules anchored on
+    the plate's own items and tests each with one AND.
+    """
+
+    def __init__(self, rules: list):
+        self.rules = []
+        self._bits = {}
+        self._by_anchor = defaultdict(list)
+
+        for rule in rules:
+            items = [str(i) for i in rule.get("items", [])]
+            if not items:
+                continue
+            mask = 0
+            for item in items:
+                mask |= 1 << self._bits.setdefault(item, len(self._bits))
+            self.rules.append({
+                "items": items,
+                "reason": rule.get("reason", ""),
+                "risk": rule.get("risk", "Moderate"),
+                "mask": mask
+            })
+
+        # Anchor each rule on its least-used item to keep every candidate list short
+        for rule_id, rule in enumerate(self.rules):
+            anchor = min(rule["items"], key=lambda i: len(self._by_anchor[i]))
+            self._by_anchor[anchor].append(rule_id)
+
+    def _plate_mask(self, plate_ids) -> int:
+        mask = 0
+        for item in plate_ids:
+            bit = self._bits.get(str(item))
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def check(self, plate_ids) -> list:
+        """Rules fully present on the plate, in curated (file) order: [{"reason", "risk", "items"}]."""
+        plate = {str(i) for i in plate_ids}
+        plate_mask = self._plate_mask(plate)
+        hits = []
+        for item in plate:
+            for rule_id in self._by_anchor.get(item, ()):
+                if self.rules[rule_id]["mask"] & plate_mask == self.rules[rule_id]["mask"]:
+                    hits.append(rule_id)
+        hits.sort()
+        return [
+            {"reason": self.rules[r]["reason"], "risk": self.rules[r]["risk"], "items": self.rules[r]["items"]}
+            for r in hits
+        ]
+
+    @staticmethod
+    def max_risk(matches: list):
+        """Highest risk level among matches (None for a clean plate)."""
+        if not matches:
+            return None
+        return max((m["risk"] for m in matches), key=lambda r: RISK_ORDER.get(r, 1))
@@ -0,0 +1,222 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from fastapi import HTTPException
+
+from imaging import SCAN_IMGSZ
+from onnx_detector import OnnxDetector, ensure_onnx_export
+
+MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "models/best.pt")
+# "torch" = ultralytics eager PyTorch, "onnx" = exported model on onnxruntime (falls back to torch)
+SCAN_BACKEND = os.getenv("SCAN_BACKEND", "torch").lower()
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "1"))
+SCAN_QUEUE_SIZE = int(os.getenv("SCAN_QUEUE_SIZE", "32"))
+SCAN_MAX_BATCH = int(os.getenv("SCAN_MAX_BATCH", "8"))
+SCAN_MAX_WAIT_MS = float(os.getenv("SCAN_MAX_WAIT_MS", "15"))
+# Run one dummy inference per worker after loading so the first real scan is fast
+SCAN_WARMUP = os.getenv("SCAN_WARMUP", "1") == "1"
+
+
+class TorchDetector:
+    """Ultralytics eager-mode detector; same call signature as OnnxDetector."""
+
+    def __init__(self, model_path: str):
+        # Deferred import: ultralytics/torch cost seconds and hundreds of MB at startup
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+
+    def prepare(self, imgsz: int = SCAN_IMGSZ):
+        """
+        Preload hook (gunicorn master, before fork): one dummy pass on a single intra-op thread.
+        The first predict() is where ultralytics deep-copies the weights into a Conv+BN-fused
+        AutoBackend and where torch/ultralytics finish their lazy init; doing it here puts all of
+        that in pages the workers share instead of a private copy per worker. With one thread no
+        OpenMP pool is created, so nothing thread-backed crosses the fork.
+        """
+        import torch
+        threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            self([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)])
+        finally:
+            torch.set_num_threads(threads)
+
+    def __call__(self, sources: list) -> list:
+        # One forward pass for the whole batch; results come back in input order
+        results = self.model(sources, verbose=False)
+        return [[int(c) for c in r.boxes.cls.tolist()] for r in results]
+
+
+class InferenceEngine:
+    """
+    Runs YOLO detection on a dedicated thread pool so scans never block the event loop.
+    Each worker thread owns its own model instance (torch releases the GIL during inference).
+    Scans arriving within max_wait_ms of each other are grouped into one batched forward pass.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, workers: int = SCAN_WORKERS, queue_size: int = SCAN_QUEUE_SIZE,
+                 max_batch: int = SCAN_MAX_BATCH, max_wait_ms: float = SCAN_MAX_WAIT_MS,
+                 backend: str = SCAN_BACKEND, imgsz: int = SCAN_IMGSZ):
+        self.model_path = model_path
+        self.backend = backend
+        self.active_backend = None
+        self.imgsz = imgsz
+        self._onnx_path = None
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.queue = None
+        self.executor = None
+        self._consumers = []
+        self._local = threading.local()
+        self._ready = None
+        self._prepare_task = None
+        # Detector loaded in the gunicorn master before fork (preload mode); shared copy-on-write
+        self._shared_model = None
+        self._claim_lock = threading.Lock()
+        # starting -> warming -> ready (or failed); reported by /health
+        self.status = "starting"
+
+    async def start(self, warmup: bool = SCAN_WARMUP):
+        """Returns immediately; model loading and warm-up continue in the background."""
+        # Queue is created here so it binds to the running (per-worker) event loop
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="yolo")
+        self._ready = asyncio.Event()
+        self._prepare_task = asyncio.create_task(self._prepare(warmup))
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def _prepare(self, warmup: bool):
+        loop = asyncio.get_running_loop()
+        try:
+            if self.active_backend is None:
+                self.active_backend = await loop.run_in_executor(self.executor, self._resolve_backend)
+            self.status = "warming"
+            # One job per worker thread; the barrier guarantees every thread loads its own detector
+            barrier = threading.Barrier(self.workers)
+            await asyncio.gather(*[
+                loop.run_in_executor(self.executor, self._warm_thread, barrier, warmup)
+                for _ in range(self.workers)
+            ])
+            self.status = "ready"
+            print(f"👁️ Vision engine ready ({self.active_backend}): {self.workers} worker(s), queue={self.queue_size}, "
+                  f"batch<={self.max_batch} within {self.max_wait * 1000:.0f}ms")
+        except Exception as e:
+            self.status = "failed"
+            print(f"❌ Vision engine failed to load: {e}")
+        finally:
+            self._ready.set()
+
+    def preload(self):
+        """
+        Preload-and-fork mode: call in the gunicorn master (preload_app) before workers fork.
+        Resolves the backend (so the ONNX export runs once, not once per worker) and loads the
+        torch weights once, fused inside a ready predictor; forked workers then share those pages copy-on-write.
+        The only inference here is TorchDetector.prepare's single-threaded pass, so no thread pools exist across the fork.
+        onnxruntime sessions own native threads and are always built inside the worker.
+        """
+        self.active_backend = self._resolve_backend()
+        if self.active_backend == "torch":
+            self._shared_model = TorchDetector(self.model_path)
+            self._shared_model.prepare(self.imgsz)
+        print(f"📦 Vision weights preloaded in master ({self.active_backend})")
+
+    def _warm_thread(self, barrier, warmup: bool):
+        barrier.wait()
+        model = self._get_model()
+        if warmup:
+            model([np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)])
+
+    async def stop(self):
+        if self._prepare_task:
+            self._prepare_task.cancel()
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _resolve_backend(self) -> str:
+        if self.backend == "onnx":
+            try:
+                import onnxruntime  # noqa: F401
+                self._onnx_path = ensure_onnx_export(self.model_path, self.imgsz)
+                return "onnx"
+            except Exception as e:
+                print(f"⚠️ ONNX backend unavailable ({e}). Falling back to ultralytics.")
+        return "torch"
+
+    def _get_model(self):
+        # One detector instance per worker thread; loaded on first job
+        model = getattr(self._local, "model", None)
+        if model is not None:
+            return model
+        # The first thread adopts the preloaded (shared) detector; any others load their own
+        with self._claim_lock:
+            model, self._shared_model = self._shared_model, None
+        if model is None:
+            if self.active_backend == "onnx":
+                model = OnnxDetector(self._onnx_path, imgsz=self.imgsz)
+            else:
+                model = TorchDetector(self.model_path)
+        self._local.model = model
+        return model
+
+    def _run(self, sources: list) -> list:
+        return self._get_model()(sources)
+
+    async def _collect_batch(self) -> list:
+        # Block for the first job, then keep filling until the batch is full or the window closes
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        # Scans that arrive while the model is still loading simply wait in the queue
+        await self._ready.wait()
+        while True:
+            batch = await self._collect_batch()
+            # Skip jobs whose request was already abandoned (client disconnect)
+            live = [(source, future) for source, future in batch if not future.done()]
+            try:
+                if live:
+                    outputs = await loop.run_in_executor(self.executor, self._run, [s for s, _ in live])
+                    for (_, future), class_ids in zip(live, outputs):
+                        if not future.done():
+                            future.set_result(class_ids)
+            except Exception as e:
+                for _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def detect(self, source) -> list:
+        """Queues one image and waits for its detected class IDs."""
+        if self.queue is None:
+            raise RuntimeError("Vision engine not started")
+        if self.status == "failed":
+            raise HTTPException(status_code=503, detail="Vision model unavailable")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((source, future))
+        return await future
+
+
+vision_engine = InferenceEngine()